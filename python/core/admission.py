@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge
+
+from core import metrics
+
+load_dotenv()
+
+ADMISSION_ACTIVE = Gauge(
+    "notq_admission_active",
+    "Calls currently holding a backend slot.",
+    ["backend"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUED = Gauge(
+    "notq_admission_queued",
+    "Calls waiting for a backend slot.",
+    ["backend"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_REJECTED = Counter(
+    "notq_admission_rejected_total",
+    "Calls rejected with 429 per backend and reason (queue_full/queue_timeout).",
+    ["backend", "reason"],
+)
+
+
+class Overloaded(Exception):
+    """Raised when a backend's concurrency limit and wait queue are exhausted."""
+
+    def __init__(self, backend: str, reason: str, retry_after: int):
+        super().__init__(f"{backend} is overloaded ({reason}); retry after {retry_after}s.")
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """Bounded concurrency with a bounded FIFO-ish wait queue for one backend.
+
+    Up to `max_concurrent` callers run at once; up to `max_queue` more wait at most
+    `queue_timeout` seconds for a slot. Anything beyond that fails fast with `Overloaded`.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTED.labels(backend=self.name, reason=reason).inc()
+        raise Overloaded(self.name, reason, self.retry_after)
+
+    def _enter(self):
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    self._reject("queue_full")
+                self._waiting += 1
+                ADMISSION_QUEUED.labels(backend=self.name).set(self._waiting)
+                try:
+                    while self._active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject("queue_timeout")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                    ADMISSION_QUEUED.labels(backend=self.name).set(self._waiting)
+            self._active += 1
+            ADMISSION_ACTIVE.labels(backend=self.name).set(self._active)
+
+    def _exit(self):
+        with self._cond:
+            self._active -= 1
+            ADMISSION_ACTIVE.labels(backend=self.name).set(self._active)
+            self._cond.notify()
+
+    def try_enter(self) -> bool:
+        """Take a slot only if one is free and nobody is queued for it; release with `_exit`."""
+        with self._cond:
+            if self._active >= self.max_concurrent or self._waiting:
+                return False
+            self._active += 1
+            ADMISSION_ACTIVE.labels(backend=self.name).set(self._active)
+            return True
+
+    @contextmanager
+    def slot(self):
+        start = time.perf_counter()
+        self._enter()
+        metrics.observe_stage("admission", self.name, time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "active": self._active,
+                "waiting": self._waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+            }
+
+
+def _limiter_from_env(name: str, concurrency: int, queue: int) -> AdmissionLimiter:
+    prefix = f"ADMISSION_{name.upper()}"
+    return AdmissionLimiter(
+        name=name,
+        max_concurrent=int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+        max_queue=int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+        queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT_SEC", "30")),
+        retry_after=int(os.getenv(f"{prefix}_RETRY_AFTER_SEC", "5")),
+    )
+
+
+LIMITERS = {
+    "speech_recognition": _limiter_from_env("speech_recognition", concurrency=20, queue=40),
+    "tts": _limiter_from_env("tts", concurrency=20, queue=40),
+    "llm": _limiter_from_env("llm", concurrency=8, queue=16),
+}
+
+
+def acquire(backend: str):
+    """Context manager holding one slot of `backend` for the duration of the block."""
+    return LIMITERS[backend].slot()
+
+
+def try_acquire(backend: str) -> bool:
+    """Take a spare slot of `backend` without waiting (for optional extra calls); pair with `release`."""
+    return LIMITERS[backend].try_enter()
+
+
+def release(backend: str):
+    LIMITERS[backend]._exit()
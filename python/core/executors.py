@@ -0,0 +1,201 @@
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge
+
+from core import admission
+from core.admission import Overloaded
+
+load_dotenv()
+
+EXECUTOR_ACTIVE = Gauge(
+    "notq_executor_active",
+    "Tasks currently running per workload executor.",
+    ["executor"],
+    multiprocess_mode="livesum",
+)
+EXECUTOR_QUEUED = Gauge(
+    "notq_executor_queued",
+    "Tasks waiting for a worker per workload executor.",
+    ["executor"],
+    multiprocess_mode="livesum",
+)
+EXECUTOR_REJECTED = Counter(
+    "notq_executor_rejected_total",
+    "Tasks rejected with 429 because the executor's queue was full.",
+    ["executor"],
+)
+
+
+class WorkloadExecutor:
+    """Thread pool reserved for one workload class, with a bounded backlog.
+
+    At most `workers` tasks run at once and at most `queue` more wait; submitting beyond
+    that raises `Overloaded`. Tasks run in a copy of the submitter's context, so per-request
+    state (profiling, stage timings) follows the work onto the pool thread.
+    """
+
+    def __init__(self, name: str, workers: int, queue: int, retry_after: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue = max(0, queue)
+        self.retry_after = retry_after
+        self._pool = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+
+    def start(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"notq-{self.name}")
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _set_gauges(self):
+        EXECUTOR_ACTIVE.labels(executor=self.name).set(self._active)
+        EXECUTOR_QUEUED.labels(executor=self.name).set(self._queued)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if self._pool is None:
+            # Outside the app lifespan (CLI, tests without startup) the pool starts on first use.
+            self.start()
+        context = contextvars.copy_context()
+        with self._lock:
+            if self._active + self._queued >= self.workers + self.queue:
+                EXECUTOR_REJECTED.labels(executor=self.name).inc()
+                raise Overloaded(self.name, "executor_queue_full", self.retry_after)
+            self._queued += 1
+            self._set_gauges()
+
+        def task():
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._set_gauges()
+            try:
+                return context.run(fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._set_gauges()
+
+        try:
+            future = self._pool.submit(task)
+        except RuntimeError:
+            with self._lock:
+                self._queued -= 1
+                self._set_gauges()
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        # A cancelled task never ran, so it is still counted as queued.
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+                self._set_gauges()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"active": self._active, "queued": self._queued, "workers": self.workers, "queue": self.queue}
+
+
+def _executor_from_env(name: str, workers: int, queue: int) -> WorkloadExecutor:
+    prefix = f"EXECUTOR_{name.upper()}"
+    return WorkloadExecutor(
+        name=name,
+        workers=int(os.getenv(f"{prefix}_WORKERS", str(workers))),
+        queue=int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+        retry_after=int(os.getenv(f"{prefix}_RETRY_AFTER_SEC", "5")),
+    )
+
+
+def _admitted(backend: str) -> int:
+    """Calls a backend's limiter can hold at once: running plus waiting in its queue."""
+    limiter = admission.LIMITERS[backend]
+    return limiter.max_concurrent + limiter.max_queue
+
+
+EXECUTORS = {
+    # Recognition sessions and syntheses mostly wait on the speech service. By default each pool
+    # has a thread for every call its admission limiter can run or queue, so requests wait in the
+    # limiter (bounded by QUEUE_TIMEOUT_SEC) rather than unbounded in the executor's own queue.
+    "recognition": _executor_from_env("recognition", workers=_admitted("speech_recognition"), queue=64),
+    "synthesis": _executor_from_env("synthesis", workers=_admitted("tts"), queue=64),
+    "llm": _executor_from_env("llm", workers=_admitted("llm"), queue=32),
+    # Sentence chunks of long TTS texts; each chunk takes its own `tts` admission slot.
+    "tts_chunks": _executor_from_env("tts_chunks", workers=_admitted("tts"), queue=256),
+    # Alignment and scoring are CPU bound; more threads than cores only adds contention.
+    "analytics": _executor_from_env("analytics", workers=os.cpu_count() or 2, queue=64),
+}
+
+
+# Worker processes for pure CPU work that threads cannot spread across cores. Live scoring
+# (SCORING_EXECUTOR=process) and bulk /rescore jobs get separate pools: a process pool is one
+# FIFO queue, so a 5000-item rescore would otherwise delay every live assessment behind it.
+PROCESS_WORKERS = int(os.getenv("EXECUTOR_PROCESS_WORKERS", str(os.cpu_count() or 2)))
+PROCESS_POOL_WORKERS = {
+    "scoring": int(os.getenv("EXECUTOR_SCORING_PROCESS_WORKERS", str(os.cpu_count() or 2))),
+    "rescore": PROCESS_WORKERS,
+}
+_process_pools = {}
+_process_pool_lock = threading.Lock()
+
+
+def process_pool(name: str) -> ProcessPoolExecutor:
+    """The `name` process pool (see PROCESS_POOL_WORKERS), created on first use.
+
+    Tasks must be picklable top-level functions.
+    """
+    with _process_pool_lock:
+        pool = _process_pools.get(name)
+        if pool is None:
+            # spawn, not fork: forking a process that runs SDK and pool threads can deadlock the child.
+            pool = ProcessPoolExecutor(max_workers=max(1, PROCESS_POOL_WORKERS[name]),
+                                       mp_context=multiprocessing.get_context("spawn"))
+            _process_pools[name] = pool
+        return pool
+
+
+def discard_process_pool(name: str, pool: ProcessPoolExecutor):
+    """Drop a pool that raised BrokenProcessPool (a worker died) so the next call starts a fresh one."""
+    with _process_pool_lock:
+        if _process_pools.get(name) is pool:
+            del _process_pools[name]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def start():
+    for executor in EXECUTORS.values():
+        executor.start()
+
+
+def shutdown(wait: bool = True):
+    for executor in EXECUTORS.values():
+        executor.shutdown(wait=wait)
+    with _process_pool_lock:
+        pools = list(_process_pools.values())
+        _process_pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def submit(name: str, fn, *args, **kwargs) -> Future:
+    """Run `fn` on the `name` executor from sync code; returns a concurrent Future."""
+    return EXECUTORS[name].submit(fn, *args, **kwargs)
+
+
+async def run(name: str, fn, *args, **kwargs):
+    """Await `fn` on the `name` executor from an async endpoint."""
+    return await asyncio.wrap_future(EXECUTORS[name].submit(fn, *args, **kwargs))
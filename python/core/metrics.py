@@ -0,0 +1,167 @@
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+from starlette.routing import Match
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+from core import profiling
+
+# Speech and LLM calls take seconds, so extend the default buckets well past 10s.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+REQUEST_LATENCY = Histogram(
+    "notq_request_duration_seconds",
+    "End-to-end request latency per endpoint.",
+    ["endpoint", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_TOTAL = Counter(
+    "notq_requests_total",
+    "Requests handled per endpoint and status code.",
+    ["endpoint", "method", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "notq_requests_in_flight",
+    "Requests currently being processed per endpoint.",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+ERRORS_TOTAL = Counter(
+    "notq_errors_total",
+    "Errors per endpoint/operation and error type.",
+    ["operation", "error_type"],
+)
+STAGE_LATENCY = Histogram(
+    "notq_stage_duration_seconds",
+    "Latency of internal stages per operation.",
+    ["operation", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+TTS_RETRIES = Counter(
+    "notq_tts_retries_total",
+    "Short-input TTS syntheses that went through the validation retry path.",
+    ["outcome"],
+)
+CACHE_EVENTS = Counter(
+    "notq_cache_events_total",
+    "Cache lookups per cache and outcome (hit/miss).",
+    ["cache", "outcome"],
+)
+PLAN_PARSE_FAILURES = Counter(
+    "notq_plan_parse_failures_total",
+    "LLM plan outputs that could not be parsed into the Plan schema.",
+)
+RECOGNITION_PATHS = Counter(
+    "notq_recognition_path_total",
+    "Recognition sessions by path (single_shot/single_shot_fallback/continuous).",
+    ["path"],
+)
+PLAN_REPAIRS = Counter(
+    "notq_plan_repairs_total",
+    "Local JSON repair attempts on plan outputs that failed to parse, by outcome (repaired/failed).",
+    ["outcome"],
+)
+
+# Set while stage timings are being collected for another process (see capture_stages).
+_captured_stages = contextvars.ContextVar("notq_captured_stages", default=None)
+
+
+@contextmanager
+def stage(operation: str, name: str):
+    """Time a block as `name` within `operation` and record it in the stage histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(operation, name, time.perf_counter() - start)
+
+
+def observe_stage(operation: str, name: str, seconds: float) -> None:
+    """Record an already measured stage duration (for stages too long to wrap in `stage()`)."""
+    captured = _captured_stages.get()
+    if captured is not None:
+        captured.append((operation, name, seconds))
+        return
+    STAGE_LATENCY.labels(operation=operation, stage=name).observe(seconds)
+    profiling.record_stage(operation, name, seconds)
+
+
+@contextmanager
+def capture_stages():
+    """Collect stage timings as (operation, stage, seconds) instead of recording them.
+
+    Worker processes have their own registry, so they capture stages and hand the list back
+    to the parent, which records it with `replay_stages`.
+    """
+    captured = []
+    token = _captured_stages.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured_stages.reset(token)
+
+
+def replay_stages(captured: list) -> None:
+    for operation, name, seconds in captured:
+        observe_stage(operation, name, seconds)
+
+
+def record_error(operation: str, error) -> None:
+    """Count an error by its type (exception class name or a short string label)."""
+    error_type = error if isinstance(error, str) else type(error).__name__
+    ERRORS_TOTAL.labels(operation=operation, error_type=error_type).inc()
+
+
+def _endpoint_label(request) -> str:
+    # Use the route template (e.g. "/public") so label cardinality stays bounded.
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", None) or "unmatched"
+    return "unmatched"
+
+
+async def metrics_middleware(request, call_next):
+    """Record per-endpoint latency, status counts, in-flight requests and unhandled errors."""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+
+    start = time.perf_counter()
+    endpoint = _endpoint_label(request)
+    REQUESTS_IN_FLIGHT.labels(endpoint=endpoint).inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    except Exception as e:
+        record_error(endpoint, e)
+        raise
+    finally:
+        REQUESTS_IN_FLIGHT.labels(endpoint=endpoint).dec()
+        REQUEST_LATENCY.labels(endpoint=endpoint, method=request.method).observe(time.perf_counter() - start)
+        REQUESTS_TOTAL.labels(endpoint=endpoint, method=request.method, status=str(status)).inc()
+        if status >= 400:
+            record_error(endpoint, f"http_{status}")
+
+
+# With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory before starting them:
+# every worker then writes its samples there and any worker's /metrics returns the sum over all of them.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+def render_latest():
+    """Return (body, content_type) for the Prometheus scrape endpoint."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Drop this worker's live gauges from the shared samples when it exits (multiprocess mode only)."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
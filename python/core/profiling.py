@@ -0,0 +1,107 @@
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Profiling is off unless explicitly enabled; when PROFILING_TOKEN is set, callers must also send it.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN") or None
+PROFILING_DIR = os.getenv("PROFILING_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "profiles")
+PROFILING_INTERVAL_SEC = float(os.getenv("PROFILING_INTERVAL_SEC", "0.001"))
+
+PROFILE_HEADER = "X-Notq-Profile"
+PROFILE_TOKEN_HEADER = "X-Notq-Profile-Token"
+PROFILE_QUERY_PARAM = "profile"
+
+
+class ProfileState:
+    """Per-request profiling state shared between the middleware and the worker thread."""
+
+    def __init__(self):
+        self.stages = {}  # "operation.stage" -> accumulated seconds
+        self.profile_files = []  # one saved profile per profiled() block, in completion order
+
+
+_current: ContextVar[Optional[ProfileState]] = ContextVar("notq_profile_state", default=None)
+
+
+def _requested(request) -> bool:
+    flag = request.headers.get(PROFILE_HEADER) or request.query_params.get(PROFILE_QUERY_PARAM)
+    if not flag or flag.lower() not in ("1", "true", "yes"):
+        return False
+    if PROFILING_TOKEN and request.headers.get(PROFILE_TOKEN_HEADER) != PROFILING_TOKEN:
+        return False
+    return True
+
+
+def record_stage(operation: str, name: str, seconds: float) -> None:
+    """Add a stage duration to the current request's Server-Timing breakdown, if profiling."""
+    state = _current.get()
+    if state is None:
+        return
+    key = f"{operation}.{name}"
+    state.stages[key] = state.stages.get(key, 0.0) + seconds
+
+
+@contextmanager
+def profiled(operation: str):
+    """Run the block under a sampling profiler when the current request opted in.
+
+    The sampler only observes the thread that started it, so enter this on every thread that
+    does a stage's work (the endpoint body, and e.g. scoring on an analytics thread); each block
+    saves its own profile file.
+    """
+    state = _current.get()
+    if state is None:
+        yield
+        return
+
+    from pyinstrument import Profiler
+
+    profiler = Profiler(interval=PROFILING_INTERVAL_SEC, async_mode="disabled")
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        try:
+            os.makedirs(PROFILING_DIR, exist_ok=True)
+            filename = f"{operation}_{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}.html"
+            with open(os.path.join(PROFILING_DIR, filename), "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            state.profile_files.append(filename)
+        except Exception:
+            pass
+
+
+def _server_timing(state: ProfileState, total_sec: float) -> str:
+    entries = [
+        f'{key.replace(".", "_")};dur={seconds * 1000:.1f};desc="{key}"'
+        for key, seconds in state.stages.items()
+    ]
+    entries.append(f"total;dur={total_sec * 1000:.1f}")
+    return ", ".join(entries)
+
+
+async def profiling_middleware(request, call_next):
+    """Enable per-request profiling and attach Server-Timing/X-Notq-Profile-File headers."""
+    if not PROFILING_ENABLED or not _requested(request):
+        return await call_next(request)
+
+    state = ProfileState()
+    token = _current.set(state)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+    response.headers["Server-Timing"] = _server_timing(state, time.perf_counter() - start)
+    if state.profile_files:
+        response.headers["X-Notq-Profile-File"] = ", ".join(state.profile_files)
+    return response
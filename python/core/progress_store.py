@@ -0,0 +1,342 @@
+"""Per-learner progress aggregates, updated incrementally as assessments complete.
+
+    python -m core.progress_store compact --older-than-days 90 --vacuum
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from core.shared_cache import connect_wal
+
+load_dotenv()
+
+PROGRESS_ENABLED = os.getenv("PROGRESS_ENABLED", "true").lower() in ("1", "true", "yes")
+PROGRESS_DB_PATH = os.getenv("PROGRESS_DB_PATH") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "progress.sqlite3")
+# Keep each assessment's full response (needed for rescoring until compacted).
+PROGRESS_STORE_RESULTS = os.getenv("PROGRESS_STORE_RESULTS", "true").lower() in ("1", "true", "yes")
+# Weight of the newest assessment in the rolling (exponential moving) averages.
+PROGRESS_EMA_ALPHA = float(os.getenv("PROGRESS_EMA_ALPHA", "0.2"))
+PROGRESS_TREND_POINTS = int(os.getenv("PROGRESS_TREND_POINTS", "50"))
+PROGRESS_COMPACT_AFTER_DAYS = float(os.getenv("PROGRESS_COMPACT_AFTER_DAYS", "90"))
+
+# Large analytics sections dropped by compaction; scores, words, counts and rates stay.
+COMPACTED_SECTIONS = ("timeline", "per_word", "raw", "segments", "segment_summaries", "transcripts")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS learners (
+    learner_id TEXT PRIMARY KEY,
+    assessments INTEGER NOT NULL,
+    first_at REAL NOT NULL,
+    last_at REAL NOT NULL,
+    last_score INTEGER,
+    last_level INTEGER,
+    accuracy_ema REAL,
+    accuracy_total REAL NOT NULL DEFAULT 0,
+    accuracy_count INTEGER NOT NULL DEFAULT 0,
+    score_ema REAL,
+    wer_ema REAL,
+    wpm_ema REAL
+);
+CREATE TABLE IF NOT EXISTS learner_words (
+    learner_id TEXT NOT NULL,
+    word TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    missed INTEGER NOT NULL,
+    accuracy_total REAL NOT NULL,
+    accuracy_count INTEGER NOT NULL,
+    last_at REAL NOT NULL,
+    PRIMARY KEY (learner_id, word)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS learner_words_missed ON learner_words (learner_id, missed DESC);
+CREATE TABLE IF NOT EXISTS learner_trend (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    learner_id TEXT NOT NULL,
+    at REAL NOT NULL,
+    score INTEGER,
+    accuracy REAL,
+    wer REAL,
+    wpm REAL
+);
+CREATE INDEX IF NOT EXISTS learner_trend_learner ON learner_trend (learner_id, id);
+CREATE TABLE IF NOT EXISTS assessments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    learner_id TEXT NOT NULL,
+    at REAL NOT NULL,
+    reference_text TEXT NOT NULL,
+    language TEXT NOT NULL,
+    result TEXT NOT NULL,
+    compacted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS assessments_learner ON assessments (learner_id, at);
+CREATE TABLE IF NOT EXISTS recorded_keys (
+    learner_id TEXT NOT NULL,
+    assessment_key TEXT NOT NULL,
+    at REAL NOT NULL,
+    PRIMARY KEY (learner_id, assessment_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS recorded_keys_at ON recorded_keys (at);
+CREATE INDEX IF NOT EXISTS assessments_compaction ON assessments (compacted, at);
+"""
+
+# Reads never replay past results: each assessment folds into running aggregates and one bounded
+# trend point. Upsert with the moving averages computed in SQL: the first value seeds each average.
+_UPSERT_LEARNER = """
+INSERT INTO learners (learner_id, assessments, first_at, last_at, last_score, last_level,
+                      accuracy_ema, accuracy_total, accuracy_count, score_ema, wer_ema, wpm_ema)
+VALUES (:learner_id, 1, :at, :at, :score, :level, :accuracy, COALESCE(:accuracy, 0), :accuracy IS NOT NULL,
+        :score, :wer, :wpm)
+ON CONFLICT(learner_id) DO UPDATE SET
+    assessments = assessments + 1,
+    last_at = :at,
+    last_score = :score,
+    last_level = :level,
+    accuracy_ema = CASE WHEN :accuracy IS NULL THEN accuracy_ema WHEN accuracy_ema IS NULL THEN :accuracy
+                        ELSE :alpha * :accuracy + (1 - :alpha) * accuracy_ema END,
+    accuracy_total = accuracy_total + COALESCE(:accuracy, 0),
+    accuracy_count = accuracy_count + (:accuracy IS NOT NULL),
+    score_ema = CASE WHEN :score IS NULL THEN score_ema WHEN score_ema IS NULL THEN :score
+                     ELSE :alpha * :score + (1 - :alpha) * score_ema END,
+    wer_ema = CASE WHEN :wer IS NULL THEN wer_ema WHEN wer_ema IS NULL THEN :wer
+                   ELSE :alpha * :wer + (1 - :alpha) * wer_ema END,
+    wpm_ema = CASE WHEN :wpm IS NULL THEN wpm_ema WHEN wpm_ema IS NULL THEN :wpm
+                   ELSE :alpha * :wpm + (1 - :alpha) * wpm_ema END
+"""
+
+_UPSERT_WORD = """
+INSERT INTO learner_words (learner_id, word, attempts, missed, accuracy_total, accuracy_count, last_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(learner_id, word) DO UPDATE SET
+    attempts = attempts + excluded.attempts,
+    missed = missed + excluded.missed,
+    accuracy_total = accuracy_total + excluded.accuracy_total,
+    accuracy_count = accuracy_count + excluded.accuracy_count,
+    last_at = excluded.last_at
+"""
+
+
+def _number(value) -> Optional[float]:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _word_counts(result: dict) -> dict:
+    """word -> [attempts, missed, accuracy total, accuracy count]; insertions are not reference words."""
+    counts = {}
+    for w in result.get("words") or []:
+        word = (w.get("word") or "").lower()
+        if not word or w.get("error_type") == "Insertion":
+            continue
+        entry = counts.setdefault(word, [0, 0, 0.0, 0])
+        entry[0] += 1
+        if w.get("error_type") in ("Omission", "Mispronunciation"):
+            entry[1] += 1
+        accuracy = _number(w.get("accuracy_score"))
+        if accuracy is not None:
+            entry[2] += accuracy
+            entry[3] += 1
+    return counts
+
+
+def compact_result(result: dict) -> dict:
+    """The result without its large analytics sections."""
+    analytics = result.get("analytics")
+    if not isinstance(analytics, dict):
+        return result
+    return {**result, "analytics": {k: v for k, v in analytics.items() if k not in COMPACTED_SECTIONS}}
+
+
+def _slope(values: list) -> Optional[float]:
+    """Least-squares change per assessment over the trend points (None with fewer than two)."""
+    points = [(i, v) for i, v in enumerate(values) if v is not None]
+    if len(points) < 2:
+        return None
+    mean_x = sum(i for i, _ in points) / len(points)
+    mean_y = sum(v for _, v in points) / len(points)
+    den = sum((i - mean_x) ** 2 for i, _ in points)
+    return round(sum((i - mean_x) * (v - mean_y) for i, v in points) / den, 4) if den else None
+
+
+class ProgressStore:
+    """Learner aggregates in one SQLite file (WAL mode), shared by every worker process."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = connect_wal(self.path, 5000)
+        with self._init_lock:
+            if not self._initialized:
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def record(self, learner_id: str, reference_text: str, language: str, result: dict,
+               assessment_key: Optional[str] = None) -> bool:
+        """Fold one completed assessment into the learner's aggregates (one transaction).
+
+        With `assessment_key` (the assessment cache key), a submission already recorded for this
+        learner, e.g. a retried upload, is skipped. Returns whether the assessment was recorded.
+        """
+        now = time.time()
+        analytics = result.get("analytics") or {}
+        values = {
+            "learner_id": learner_id,
+            "at": now,
+            "score": _number(result.get("score")),
+            "level": _number(result.get("level_measured")),
+            "accuracy": _number(result.get("accuracy_score")),
+            "wer": _number(analytics.get("word_error_rate_percent")),
+            "wpm": _number((analytics.get("speaking_rates") or {}).get("wpm_articulation_time")),
+            "alpha": PROGRESS_EMA_ALPHA,
+        }
+        conn = self._connect()
+        with conn:
+            if assessment_key is not None and not conn.execute(
+                "INSERT OR IGNORE INTO recorded_keys (learner_id, assessment_key, at) VALUES (?, ?, ?)",
+                (learner_id, assessment_key, now),
+            ).rowcount:
+                return False
+            conn.execute(_UPSERT_LEARNER, values)
+            conn.executemany(_UPSERT_WORD, [
+                (learner_id, word, attempts, missed, accuracy_total, accuracy_count, now)
+                for word, (attempts, missed, accuracy_total, accuracy_count) in _word_counts(result).items()
+            ])
+            conn.execute(
+                "INSERT INTO learner_trend (learner_id, at, score, accuracy, wer, wpm) VALUES (?, ?, ?, ?, ?, ?)",
+                (learner_id, now, values["score"], values["accuracy"], values["wer"], values["wpm"]),
+            )
+            conn.execute(
+                "DELETE FROM learner_trend WHERE learner_id = ? AND id <= "
+                "(SELECT id FROM learner_trend WHERE learner_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (learner_id, learner_id, PROGRESS_TREND_POINTS),
+            )
+            if PROGRESS_STORE_RESULTS:
+                conn.execute(
+                    "INSERT INTO assessments (learner_id, at, reference_text, language, result) VALUES (?, ?, ?, ?, ?)",
+                    (learner_id, now, reference_text, language, json.dumps(result, ensure_ascii=False)),
+                )
+        return True
+
+    def progress(self, learner_id: str, top_words: int = 10) -> Optional[dict]:
+        """The learner's aggregates, most-missed words and recent trend; None for an unknown learner."""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT assessments, first_at, last_at, last_score, last_level, accuracy_ema, accuracy_total, "
+            "accuracy_count, score_ema, wer_ema, wpm_ema FROM learners WHERE learner_id = ?",
+            (learner_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        (assessments, first_at, last_at, last_score, last_level, accuracy_ema, accuracy_total,
+         accuracy_count, score_ema, wer_ema, wpm_ema) = row
+        words = conn.execute(
+            "SELECT word, attempts, missed, accuracy_total, accuracy_count FROM learner_words "
+            "WHERE learner_id = ? AND missed > 0 ORDER BY missed DESC, attempts DESC LIMIT ?",
+            (learner_id, top_words),
+        ).fetchall()
+        trend = conn.execute(
+            "SELECT at, score, accuracy, wer, wpm FROM learner_trend WHERE learner_id = ? ORDER BY id",
+            (learner_id,),
+        ).fetchall()
+        return {
+            "learner_id": learner_id,
+            "assessments": assessments,
+            "first_at": first_at,
+            "last_at": last_at,
+            "last_score": last_score,
+            "last_level": last_level,
+            "accuracy": {
+                "rolling": accuracy_ema,
+                "lifetime": accuracy_total / accuracy_count if accuracy_count else None,
+            },
+            "score_rolling": score_ema,
+            "wer_rolling": wer_ema,
+            "wpm_rolling": wpm_ema,
+            "most_missed_words": [
+                {
+                    "word": word,
+                    "attempts": attempts,
+                    "missed": missed,
+                    "missed_rate": missed / attempts,
+                    "avg_accuracy": total / count if count else None,
+                }
+                for word, attempts, missed, total, count in words
+            ],
+            "trend": {
+                "points": [
+                    {"at": at, "score": score, "accuracy": accuracy, "wer": wer, "wpm": wpm}
+                    for at, score, accuracy, wer, wpm in trend
+                ],
+                "accuracy_slope": _slope([t[2] for t in trend]),
+                "wer_slope": _slope([t[3] for t in trend]),
+                "wpm_slope": _slope([t[4] for t in trend]),
+            },
+        }
+
+    def compact(self, older_than_days: float = PROGRESS_COMPACT_AFTER_DAYS, batch: int = 500, vacuum: bool = False) -> dict:
+        """Strip the large analytics sections from stored results older than `older_than_days`.
+
+        Aggregates are unaffected; compacted results can no longer be rescored. Retry-detection
+        keys of the same age are dropped too.
+        """
+        cutoff = time.time() - older_than_days * 86400
+        conn = self._connect()
+        compacted = 0
+        bytes_before = bytes_after = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, result FROM assessments WHERE compacted = 0 AND at < ? LIMIT ?", (cutoff, batch)
+            ).fetchall()
+            if not rows:
+                break
+            updates = []
+            for row_id, text in rows:
+                try:
+                    slim = json.dumps(compact_result(json.loads(text)), ensure_ascii=False)
+                except ValueError:
+                    slim = text
+                bytes_before += len(text)
+                bytes_after += len(slim)
+                updates.append((slim, row_id))
+            # Short transactions per batch keep writers in other workers from waiting long.
+            with conn:
+                conn.executemany("UPDATE assessments SET result = ?, compacted = 1 WHERE id = ?", updates)
+            compacted += len(updates)
+        with conn:
+            keys_removed = conn.execute("DELETE FROM recorded_keys WHERE at < ?", (cutoff,)).rowcount
+        if vacuum and (compacted or keys_removed):
+            conn.execute("VACUUM")
+        return {"compacted": compacted, "bytes_before": bytes_before, "bytes_after": bytes_after, "keys_removed": keys_removed}
+
+
+progress_store = ProgressStore(PROGRESS_DB_PATH)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the learner progress store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compact = sub.add_parser("compact", help="Strip timeline/per-word/raw payloads from old stored results")
+    compact.add_argument("--older-than-days", type=float, default=PROGRESS_COMPACT_AFTER_DAYS)
+    compact.add_argument("--vacuum", action="store_true", help="Reclaim the freed space afterwards")
+    args = parser.parse_args(argv)
+
+    summary = progress_store.compact(args.older_than_days, vacuum=args.vacuum)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+from dotenv import load_dotenv
+
+from core import metrics
+from core.shared_cache import SharedCache, shared_cache
+
+load_dotenv()
+
+ASSESSMENT_CACHE_ENABLED = os.getenv("ASSESSMENT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ASSESSMENT_CACHE_TTL_SEC = float(os.getenv("ASSESSMENT_CACHE_TTL_SEC", "86400"))
+ASSESSMENT_CACHE_MAX_ENTRIES = int(os.getenv("ASSESSMENT_CACHE_MAX_ENTRIES", "5000"))
+ASSESSMENT_CACHE_MAX_MB = float(os.getenv("ASSESSMENT_CACHE_MAX_MB", "500"))
+
+# Synthesized audio per (text, voice, language): whole short texts and the sentences of long ones.
+TTS_AUDIO_CACHE_ENABLED = os.getenv("TTS_AUDIO_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+TTS_AUDIO_CACHE_TTL_SEC = float(os.getenv("TTS_AUDIO_CACHE_TTL_SEC", str(7 * 24 * 3600)))
+TTS_AUDIO_CACHE_MAX_ENTRIES = int(os.getenv("TTS_AUDIO_CACHE_MAX_ENTRIES", "20000"))
+TTS_AUDIO_CACHE_MAX_MB = float(os.getenv("TTS_AUDIO_CACHE_MAX_MB", "1000"))
+
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PLAN_CACHE_TTL_SEC = float(os.getenv("PLAN_CACHE_TTL_SEC", "3600"))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "2000"))
+PLAN_CACHE_MAX_MB = float(os.getenv("PLAN_CACHE_MAX_MB", "50"))
+
+# The voice catalog snapshot; freshness is judged by its fetched_at, the TTL only bounds a stale fallback.
+VOICE_CACHE_TTL_SEC = float(os.getenv("VOICE_CACHE_TTL_SEC", str(90 * 24 * 3600)))
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def copy_and_hash(src, dst) -> str:
+    """Copy a file object to another while hashing it; returns the sha256 hex digest."""
+    digest = hashlib.sha256()
+    while True:
+        chunk = src.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        dst.write(chunk)
+    return digest.hexdigest()
+
+
+def content_key(**fields) -> str:
+    """Stable sha256 key over JSON-serializable fields."""
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def assessment_key(audio_sha256: str, reference_text: str, language: str, options: dict) -> str:
+    """Cache key for an assessment: audio fingerprint plus everything that affects the result."""
+    return content_key(audio=audio_sha256, reference_text=reference_text, language=language, options=options)
+
+
+class ResultCache:
+    """One namespace of the shared cache, with TTL and entry/size limits plus in-process request coalescing.
+
+    Values are JSON documents, or raw bytes (e.g. audio) with `binary=True`. Entries are shared by
+    every worker process; cache failures never fail the request, they only cost a recomputation.
+    """
+
+    def __init__(self, name: str, ttl_sec: float, max_entries: int, max_bytes: int, evict_every: int = 50,
+                 binary: bool = False, store: SharedCache = shared_cache):
+        self.name = name
+        self.binary = binary
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.store = store
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._writes = 0
+
+    def get(self, key: str, count: bool = True):
+        try:
+            value = self.store.get(self.name, key, count=count)
+            if value is None or self.binary:
+                return value
+            return json.loads(value)
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def set(self, key: str, value) -> None:
+        data = value if self.binary else json.dumps(value, ensure_ascii=False).encode("utf-8")
+        self.store.set(self.name, key, data, self.ttl_sec)
+        with self._lock:
+            self._writes += 1
+            should_evict = self._writes % self.evict_every == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop expired entries, then the least recently used ones until under the entry and byte limits."""
+        self.store.evict(self.name, self.max_entries, self.max_bytes)
+
+    def get_or_compute(self, key: str, compute: Callable):
+        """Return the cached value or compute it once; concurrent callers for the same key share one computation."""
+        cached = self.get(key)
+        if cached is not None:
+            metrics.CACHE_EVENTS.labels(cache=self.name, outcome="hit").inc()
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            metrics.CACHE_EVENTS.labels(cache=self.name, outcome="coalesced").inc()
+            return future.result()
+
+        try:
+            # Another owner may have stored the value between our lookup and taking ownership
+            # (it sets the cache before leaving _inflight); look again before calling the backend.
+            # Not counted: the first lookup already counted this request's miss.
+            value = self.get(key, count=False)
+            if value is not None:
+                metrics.CACHE_EVENTS.labels(cache=self.name, outcome="coalesced").inc()
+                future.set_result(value)
+                return value
+            metrics.CACHE_EVENTS.labels(cache=self.name, outcome="miss").inc()
+            value = compute()
+            try:
+                self.set(key, value)
+            except Exception:
+                pass
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+assessment_cache = ResultCache(
+    name="assessment",
+    ttl_sec=ASSESSMENT_CACHE_TTL_SEC,
+    max_entries=ASSESSMENT_CACHE_MAX_ENTRIES,
+    max_bytes=int(ASSESSMENT_CACHE_MAX_MB * 1024 * 1024),
+)
+
+tts_audio_cache = ResultCache(
+    name="tts_audio",
+    ttl_sec=TTS_AUDIO_CACHE_TTL_SEC,
+    max_entries=TTS_AUDIO_CACHE_MAX_ENTRIES,
+    max_bytes=int(TTS_AUDIO_CACHE_MAX_MB * 1024 * 1024),
+    binary=True,
+)
+
+plan_cache = ResultCache(
+    name="plan",
+    ttl_sec=PLAN_CACHE_TTL_SEC,
+    max_entries=PLAN_CACHE_MAX_ENTRIES,
+    max_bytes=int(PLAN_CACHE_MAX_MB * 1024 * 1024),
+)
+
+voice_cache = ResultCache(
+    name="voices",
+    ttl_sec=VOICE_CACHE_TTL_SEC,
+    max_entries=16,
+    max_bytes=64 * 1024 * 1024,
+)
+
+CACHES = (assessment_cache, tts_audio_cache, plan_cache, voice_cache)
+
+
+def stats() -> dict:
+    """Shared cache stats per namespace (all workers), with each cache's limits."""
+    try:
+        snapshot = shared_cache.stats()
+    except sqlite3.Error as e:
+        return {"path": shared_cache.path, "error": str(e), "namespaces": {}}
+    for cache in CACHES:
+        entry = snapshot["namespaces"].setdefault(cache.name, {"entries": 0, "bytes": 0, "hits": 0, "misses": 0,
+                                                               "hit_rate": 0.0, "writes": 0, "evictions": 0})
+        entry.update(ttl_sec=cache.ttl_sec, max_entries=cache.max_entries, max_bytes=cache.max_bytes)
+    return snapshot
@@ -0,0 +1,231 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH") or os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "shared.sqlite3")
+# How long a writer waits for another process's transaction before giving up on that cache operation.
+SHARED_CACHE_BUSY_TIMEOUT_MS = int(os.getenv("SHARED_CACHE_BUSY_TIMEOUT_MS", "5000"))
+# Lookups only read; hit/miss counts and LRU touches are kept in process and written at most this often
+# (and before every write, eviction and stats read), so cache reads never queue for the write lock.
+SHARED_CACHE_FLUSH_SEC = float(os.getenv("SHARED_CACHE_FLUSH_SEC", "5"))
+_FLUSH_MAX_TOUCHES = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (namespace, accessed_at);
+CREATE TABLE IF NOT EXISTS stats (
+    namespace TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    writes INTEGER NOT NULL DEFAULT 0,
+    evictions INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def connect_wal(path: str, busy_timeout_ms: int) -> sqlite3.Connection:
+    """Open a SQLite file in WAL mode for use by many threads and processes (one connection per thread)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL with synchronous=NORMAL survives process crashes; only an OS crash can lose the last commits.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SharedCache:
+    """Key/value store in one SQLite file (WAL mode) shared by every worker process on the host.
+
+    Entries live in namespaces, each with its own TTL and limits (applied by the caller through
+    `evict`). `get` is a plain read: in WAL mode it neither takes nor waits for the write lock.
+    Hits refresh the entry's LRU position and hit/miss/write/eviction counts are kept per namespace
+    in the same file, so stats cover all workers; the read-side updates are batched in process and
+    flushed every SHARED_CACHE_FLUSH_SEC, so other workers see them with that much delay.
+    Each thread gets its own connection; failures surface as sqlite3.Error for callers to ignore.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._pending_lock = threading.Lock()
+        self._pending_counts = {}  # (namespace, "hits"/"misses") -> count since the last flush
+        self._pending_touches = {}  # (namespace, key) -> last hit time since the last flush
+        self._flushed_at = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # A connection must not cross a fork; reopen in the child.
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = connect_wal(self.path, SHARED_CACHE_BUSY_TIMEOUT_MS)
+        with self._init_lock:
+            if not self._initialized:
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, conn: sqlite3.Connection, namespace: str, column: str, amount: int = 1):
+        conn.execute(
+            f"INSERT INTO stats (namespace, {column}) VALUES (?, ?) "
+            f"ON CONFLICT(namespace) DO UPDATE SET {column} = {column} + excluded.{column}",
+            (namespace, amount),
+        )
+
+    def _flush(self, conn: sqlite3.Connection):
+        """Write pending hit/miss counts and LRU touches; call inside a transaction."""
+        with self._pending_lock:
+            counts, self._pending_counts = self._pending_counts, {}
+            touches, self._pending_touches = self._pending_touches, {}
+            self._flushed_at = time.monotonic()
+        if touches:
+            conn.executemany(
+                "UPDATE entries SET accessed_at = MAX(accessed_at, ?) WHERE namespace = ? AND key = ?",
+                [(at, namespace, key) for (namespace, key), at in touches.items()],
+            )
+        for (namespace, column), amount in counts.items():
+            self._count(conn, namespace, column, amount)
+
+    def flush(self) -> None:
+        """Write pending lookup counts and LRU touches now (e.g. before the process exits)."""
+        conn = self._connect()
+        with conn:
+            self._flush(conn)
+
+    def get(self, namespace: str, key: str, count: bool = True) -> Optional[bytes]:
+        """The live value, or None; `count=False` skips the hit/miss counters and LRU touch."""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, now),
+        ).fetchone()
+        if not count:
+            return None if row is None else row[0]
+        column = "misses" if row is None else "hits"
+        with self._pending_lock:
+            self._pending_counts[(namespace, column)] = self._pending_counts.get((namespace, column), 0) + 1
+            if row is not None:
+                self._pending_touches[(namespace, key)] = now
+            due = (time.monotonic() - self._flushed_at >= SHARED_CACHE_FLUSH_SEC
+                   or len(self._pending_touches) >= _FLUSH_MAX_TOUCHES)
+        if due:
+            # Counters and LRU order are best effort; a busy file must not turn this lookup into a failure.
+            try:
+                with conn:
+                    self._flush(conn)
+            except sqlite3.Error:
+                pass
+        return None if row is None else row[0]
+
+    def set(self, namespace: str, key: str, value: bytes, ttl_sec: float) -> None:
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, created_at, accessed_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, key, sqlite3.Binary(value), len(value), now, now, now + ttl_sec),
+            )
+            self._count(conn, namespace, "writes")
+            self._flush(conn)
+
+    def delete(self, namespace: str, key: str) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def evict(self, namespace: str, max_entries: int, max_bytes: int) -> int:
+        """Drop expired entries, then least recently used ones until under both limits; returns the count."""
+        conn = self._connect()
+        with conn:
+            # Pending LRU touches first, so this process's recent hits are not evicted as cold.
+            self._flush(conn)
+            removed = conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND expires_at <= ?", (namespace, time.time())
+            ).rowcount
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?", (namespace,)
+            ).fetchone()
+            if count > max_entries or total > max_bytes:
+                victims = []
+                for key, size in conn.execute(
+                    "SELECT key, size FROM entries WHERE namespace = ? ORDER BY accessed_at", (namespace,)
+                ):
+                    if count <= max_entries and total <= max_bytes:
+                        break
+                    victims.append((namespace, key))
+                    count -= 1
+                    total -= size
+                conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", victims)
+                removed += len(victims)
+            if removed:
+                self._count(conn, namespace, "evictions", removed)
+        return removed
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        conn = self._connect()
+        with conn:
+            if namespace is None:
+                conn.execute("DELETE FROM entries")
+            else:
+                conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> dict:
+        """Per-namespace entry count, bytes and counters, across all processes sharing the file.
+
+        Other workers' lookups appear once they flush, within SHARED_CACHE_FLUSH_SEC.
+        """
+        conn = self._connect()
+        with conn:
+            self._flush(conn)
+        namespaces = {}
+        for namespace, hits, misses, writes, evictions in conn.execute(
+            "SELECT namespace, hits, misses, writes, evictions FROM stats"
+        ):
+            lookups = hits + misses
+            namespaces[namespace] = {
+                "entries": 0,
+                "bytes": 0,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "writes": writes,
+                "evictions": evictions,
+            }
+        for namespace, count, total in conn.execute(
+            "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY namespace"
+        ):
+            entry = namespaces.setdefault(namespace, {"hits": 0, "misses": 0, "hit_rate": 0.0, "writes": 0, "evictions": 0})
+            entry.update(entries=count, bytes=total)
+        return {"path": self.path, "namespaces": namespaces}
+
+
+shared_cache = SharedCache(SHARED_CACHE_PATH)
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        shared_cache.flush()
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,276 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+import azure.cognitiveservices.speech as speechsdk
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge
+
+from core import admission, metrics
+
+ENDPOINT_FAILURES = Counter(
+    "notq_speech_endpoint_failures_total",
+    "Backend failures per speech workload and endpoint.",
+    ["kind", "endpoint"],
+)
+CIRCUIT_OPEN = Gauge(
+    "notq_speech_circuit_open",
+    "1 while an endpoint's circuit breaker is open.",
+    ["kind", "endpoint"],
+    multiprocess_mode="livemax",
+)
+HEDGES = Counter(
+    "notq_speech_hedges_total",
+    "Hedged speech requests per workload and outcome (launched/won/skipped).",
+    ["kind", "outcome"],
+)
+
+# Hedge attempts run here so the request thread can wait on whichever finishes first.
+_hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv("AZURE_SPEECH_HEDGE_WORKERS", "32")), thread_name_prefix="speech-hedge")
+
+
+class SpeechBackendError(Exception):
+    """A speech call failed for backend reasons (connection, auth, quota) and may succeed elsewhere."""
+
+
+class NoSpeechEndpoints(SpeechBackendError):
+    """No endpoints are configured for a workload, so there is nothing to fail over to."""
+
+
+class SpeechEndpoint:
+    """One region/key pair, or a custom host (e.g. a local container or stand-in backend)."""
+
+    def __init__(self, key: str, region: Optional[str] = None, host: Optional[str] = None, endpoint: Optional[str] = None, name: Optional[str] = None):
+        self.key = key
+        self.region = region
+        self.host = host
+        self.endpoint = endpoint
+        self.name = name or region or host or endpoint
+
+    def speech_config(self) -> speechsdk.SpeechConfig:
+        if self.host:
+            return speechsdk.SpeechConfig(host=self.host, subscription=self.key)
+        if self.endpoint:
+            return speechsdk.SpeechConfig(endpoint=self.endpoint, subscription=self.key)
+        return speechsdk.SpeechConfig(subscription=self.key, region=self.region)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; allows one trial call after `cooldown_sec`."""
+
+    def __init__(self, failure_threshold: int, cooldown_sec: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_sec = cooldown_sec
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    def available(self, now: float) -> bool:
+        return self.opened_at is None or now - self.opened_at >= self.cooldown_sec
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self, now: float):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            # Re-arm the cooldown on every failure so a failed half-open trial stays open.
+            self.opened_at = now
+
+
+class EndpointPool:
+    """Ordered speech endpoints with circuit breakers, failover and optional hedging."""
+
+    def __init__(self, kind: str, endpoints: List[SpeechEndpoint], hedge: bool, hedge_after_sec: float,
+                 failure_threshold: int = 3, cooldown_sec: float = 30.0, latency_window: int = 200, min_samples: int = 20,
+                 admission_backend: Optional[str] = None):
+        self.kind = kind
+        # A hedge is an extra backend call on top of the caller's admitted one, so it needs a spare slot.
+        self.admission_backend = admission_backend
+        self.endpoints = endpoints
+        self.hedge = hedge
+        self.hedge_after_sec = hedge_after_sec
+        self.min_samples = min_samples
+        self._breakers = {ep.name: CircuitBreaker(failure_threshold, cooldown_sec) for ep in endpoints}
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+
+    def candidates(self) -> List[SpeechEndpoint]:
+        """Endpoints in preference order: available ones first, open circuits last (never none)."""
+        now = time.monotonic()
+        with self._lock:
+            available = [ep for ep in self.endpoints if self._breakers[ep.name].available(now)]
+            tripped = sorted(
+                (ep for ep in self.endpoints if ep not in available),
+                key=lambda ep: self._breakers[ep.name].opened_at,
+            )
+        return available + tripped
+
+    def hedge_delay(self) -> float:
+        """p95 of recent successful call latencies, or the configured default until enough samples."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.hedge_after_sec
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def _record(self, ep: SpeechEndpoint, ok: bool, elapsed: float):
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._breakers[ep.name]
+            if ok:
+                breaker.record_success()
+                self._latencies.append(elapsed)
+            else:
+                breaker.record_failure(now)
+            is_open = not breaker.available(now)
+        if not ok:
+            ENDPOINT_FAILURES.labels(kind=self.kind, endpoint=ep.name).inc()
+        CIRCUIT_OPEN.labels(kind=self.kind, endpoint=ep.name).set(1 if is_open else 0)
+
+    def _attempt(self, ep: SpeechEndpoint, fn: Callable):
+        start = time.perf_counter()
+        try:
+            result = fn(ep)
+        except SpeechBackendError:
+            self._record(ep, False, time.perf_counter() - start)
+            raise
+        self._record(ep, True, time.perf_counter() - start)
+        return result
+
+    def call(self, fn: Callable, discard: Optional[Callable] = None):
+        """Run `fn(endpoint)` with failover across endpoints.
+
+        `fn` should raise `SpeechBackendError` for failures worth retrying elsewhere; only those
+        count against an endpoint's circuit breaker. Any other exception (a bad upload, a bug)
+        is raised to the caller at once without trying more endpoints. With hedging enabled, a second endpoint is started if the first has not
+        answered within the hedge delay; the first success wins and `discard` is called
+        with the results of any attempts that complete after that. Each hedge takes a free slot of
+        `admission_backend` for its duration and is skipped when none is free.
+        """
+        candidates = self.candidates()
+        if not candidates:
+            raise NoSpeechEndpoints(f"No speech endpoints configured for {self.kind}.")
+        if self.hedge and len(candidates) > 1:
+            return self._call_hedged(fn, candidates, discard)
+
+        last_error = None
+        for ep in candidates:
+            try:
+                return self._attempt(ep, fn)
+            except SpeechBackendError as e:
+                metrics.record_error(self.kind, e)
+                last_error = e
+        raise last_error
+
+    def _call_hedged(self, fn: Callable, candidates: List[SpeechEndpoint], discard: Optional[Callable]):
+        remaining = list(candidates)
+        launched = []
+        running = set()
+        last_error = None
+
+        def _discard_late(future):
+            # Attempts that lost the race still complete; let the caller clean up their output.
+            if discard and future.exception() is None:
+                try:
+                    discard(future.result())
+                except Exception:
+                    pass
+
+        def _launch(hedge: bool = False):
+            # Copy the request context so stage timings still reach metrics/Server-Timing.
+            ctx = contextvars.copy_context()
+            future = _hedge_executor.submit(ctx.run, self._attempt, remaining.pop(0), fn)
+            if hedge and self.admission_backend:
+                future.add_done_callback(lambda _: admission.release(self.admission_backend))
+            launched.append(future)
+            running.add(future)
+
+        _launch()
+        hedging = True
+        while running:
+            timeout = self.hedge_delay() if remaining and hedging else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if self.admission_backend and not admission.try_acquire(self.admission_backend):
+                    # The backend is at its admission limit; keep waiting on the attempts already running.
+                    HEDGES.labels(kind=self.kind, outcome="skipped").inc()
+                    hedging = False
+                    continue
+                HEDGES.labels(kind=self.kind, outcome="launched").inc()
+                _launch(hedge=True)
+                continue
+            for future in done:
+                running.discard(future)
+                error = future.exception()
+                if error is None or not isinstance(error, SpeechBackendError):
+                    if error is None and future is not launched[0]:
+                        HEDGES.labels(kind=self.kind, outcome="won").inc()
+                    for other in running:
+                        other.add_done_callback(_discard_late)
+                    return future.result()
+                last_error = error
+                metrics.record_error(self.kind, last_error)
+            if not running and remaining:
+                # The attempt failed rather than stalled: fail over immediately.
+                _launch()
+        raise last_error
+
+
+def endpoints_from_env(kind: str) -> List[SpeechEndpoint]:
+    """Read `AZURE_SPEECH_ENDPOINTS_<KIND>` (JSON list) or fall back to the single key/region pair.
+
+    Each list entry is an object with `key` and one of `region`, `host` or `endpoint`, plus
+    an optional `name`, e.g. `[{"region": "eastus", "key": "..."}, {"host": "ws://localhost:5000", "key": "x"}]`.
+    """
+    raw = os.getenv(f"AZURE_SPEECH_ENDPOINTS_{kind}")
+    if raw:
+        entries = json.loads(raw)
+        return [
+            SpeechEndpoint(
+                key=e.get("key", ""),
+                region=e.get("region"),
+                host=e.get("host"),
+                endpoint=e.get("endpoint"),
+                name=e.get("name"),
+            )
+            for e in entries
+        ]
+    key = os.getenv(f"AZURE_SPEECH_KEY_{kind}")
+    region = os.getenv(f"AZURE_SPEECH_REGION_{kind}")
+    if key and region:
+        return [SpeechEndpoint(key=key, region=region)]
+    return []
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Admission backend whose slots hedges of each workload take.
+_ADMISSION_BACKENDS = {"TTS": "tts", "LEVEL_MEASUREMENT": "speech_recognition"}
+
+
+def pool(kind: str, default_hedge_after_sec: float) -> EndpointPool:
+    """Return the process-wide endpoint pool for a workload (`TTS`, `LEVEL_MEASUREMENT`)."""
+    with _pools_lock:
+        existing = _pools.get(kind)
+        if existing is not None:
+            return existing
+        load_dotenv()
+        created = EndpointPool(
+            kind=kind,
+            endpoints=endpoints_from_env(kind),
+            hedge=os.getenv(f"AZURE_SPEECH_HEDGE_{kind}", "false").lower() in ("1", "true", "yes"),
+            hedge_after_sec=float(os.getenv(f"AZURE_SPEECH_HEDGE_AFTER_SEC_{kind}", str(default_hedge_after_sec))),
+            failure_threshold=int(os.getenv("AZURE_SPEECH_CIRCUIT_FAILURES", "3")),
+            cooldown_sec=float(os.getenv("AZURE_SPEECH_CIRCUIT_COOLDOWN_SEC", "30")),
+            admission_backend=_ADMISSION_BACKENDS.get(kind),
+        )
+        # Only cache usable pools so a missing .env can be fixed without a restart.
+        if created.endpoints:
+            _pools[kind] = created
+        return created
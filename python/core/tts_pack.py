@@ -0,0 +1,206 @@
+"""Packed bundles of pre-synthesized TTS audio.
+
+Layout of a `.pack` file:
+
+    8 bytes   magic b"NOTQPK1\\0"
+    8 bytes   index offset (little-endian u64)
+    8 bytes   index length (little-endian u64)
+    ...       WAV blobs, back to back
+    ...       JSON index: {"entries": {id: {offset, length, text, voice, language}}, ...}
+
+Build one from a manifest (JSON list or JSON lines of {text, voice, language, id?}):
+
+    python -m core.tts_pack manifest.jsonl packs/curriculum.pack --workers 8
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAGIC = b"NOTQPK1\0"
+HEADER = struct.Struct("<8sQQ")
+TTS_PACKS_DIR = os.getenv("TTS_PACKS_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "packs")
+_PACK_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def entry_id(text: str, voice: str, language: str) -> str:
+    """Stable id for a (text, voice, language) entry when the manifest does not give one."""
+    return hashlib.sha1(f"{text}\x1f{voice}\x1f{language}".encode("utf-8")).hexdigest()[:16]
+
+
+def read_manifest(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        entries = json.loads(content)
+    else:
+        entries = [json.loads(line) for line in content.splitlines() if line.strip()]
+    for e in entries:
+        e.setdefault("language", "en-US")
+        e.setdefault("voice", "")
+        e.setdefault("id", entry_id(e["text"], e["voice"], e["language"]))
+    return entries
+
+
+def _synthesize_entry(entry: dict) -> dict:
+    from nodes.text_to_speech import synthesize_to_bytes
+    from core.speech_endpoints import SpeechBackendError
+
+    try:
+        result = synthesize_to_bytes(text=entry["text"], voice_name=entry["voice"], language=entry["language"])
+    except SpeechBackendError as e:
+        return {"id": entry["id"], "success": False, "message": str(e)}
+    if not result.get("success"):
+        return {"id": entry["id"], "success": False, "message": result.get("message")}
+    return {"id": entry["id"], "success": True, "audio": result["audio"]}
+
+
+def build_pack(entries: list, out_path: str, workers: int = 8) -> dict:
+    """Synthesize all manifest entries in parallel and write them into one pack file atomically."""
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    os.makedirs(out_dir, exist_ok=True)
+    by_id = {e["id"]: e for e in entries}
+    index = {}
+    failures = []
+
+    fd, tmp_pack = tempfile.mkstemp(dir=out_dir, suffix=".pack.tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(HEADER.pack(MAGIC, 0, 0))
+            offset = HEADER.size
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                for item in pool.map(_synthesize_entry, by_id.values()):
+                    if not item["success"]:
+                        failures.append({"id": item["id"], "message": item["message"]})
+                        continue
+                    entry = by_id[item["id"]]
+                    out.write(item["audio"])
+                    index[item["id"]] = {
+                        "offset": offset,
+                        "length": len(item["audio"]),
+                        "text": entry["text"],
+                        "voice": entry["voice"],
+                        "language": entry["language"],
+                    }
+                    offset += len(item["audio"])
+            index_bytes = json.dumps(
+                {"entries": index, "created": time.time(), "content_type": "audio/wav"},
+                ensure_ascii=False,
+            ).encode("utf-8")
+            out.write(index_bytes)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, offset, len(index_bytes)))
+        os.replace(tmp_pack, out_path)
+    except Exception:
+        try:
+            os.remove(tmp_pack)
+        except OSError:
+            pass
+        raise
+    return {"output_file": out_path, "entries": len(index), "failures": failures}
+
+
+class TtsPack:
+    """Read-only, memory-mapped view of a pack file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a TTS pack")
+        meta = json.loads(self._mmap[index_offset:index_offset + index_length])
+        self.entries = meta["entries"]
+        self.content_type = meta.get("content_type", "audio/wav")
+
+    def read(self, eid: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Bytes [start, end] (inclusive) of an entry, sliced straight out of the mapping."""
+        e = self.entries[eid]
+        last = e["length"] - 1 if end is None else min(end, e["length"] - 1)
+        return self._mmap[e["offset"] + start:e["offset"] + last + 1]
+
+    def close(self):
+        self._mmap.close()
+
+
+_packs = {}
+_packs_lock = threading.Lock()
+
+
+def get_pack(name: str) -> Optional[TtsPack]:
+    """Return the mapped pack `<TTS_PACKS_DIR>/<name>.pack`, remapping it if the file was rebuilt."""
+    if not _PACK_NAME.match(name):
+        return None
+    path = os.path.join(TTS_PACKS_DIR, f"{name}.pack")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _packs_lock:
+        pack = _packs.get(name)
+        if pack is None or pack.mtime != mtime:
+            # The old mapping stays valid for in-flight readers; it is released when collected.
+            pack = TtsPack(path)
+            _packs[name] = pack
+        return pack
+
+
+def list_packs() -> list:
+    if not os.path.isdir(TTS_PACKS_DIR):
+        return []
+    return sorted(f[:-5] for f in os.listdir(TTS_PACKS_DIR) if f.endswith(".pack"))
+
+
+def parse_range(header: Optional[str], length: int):
+    """Parse a single `bytes=` range; returns (start, end) inclusive, or None to send the whole body.
+
+    Multiple ranges and other units are ignored (None), as RFC 9110 allows; only a single range
+    that cannot be satisfied raises ValueError (416).
+    """
+    if not header:
+        return None
+    m = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else length - 1
+    else:
+        # Suffix range: the last N bytes.
+        start = max(0, length - int(m.group(2)))
+        end = length - 1
+    if start >= length or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, length - 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-synthesize a TTS manifest into a pack file.")
+    parser.add_argument("manifest", help="JSON list or JSON lines of {text, voice, language, id?}")
+    parser.add_argument("output", help="Pack file to write, e.g. packs/curriculum.pack")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel synthesis calls")
+    args = parser.parse_args(argv)
+
+    summary = build_pack(read_manifest(args.manifest), args.output, workers=args.workers)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 1 if summary["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
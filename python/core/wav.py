@@ -0,0 +1,135 @@
+import os
+import struct
+import sys
+from array import array
+from typing import NamedTuple, Optional
+
+RIFF_HEADER_SIZE = 12
+CHUNK_HEADER_SIZE = 8
+# Streaming writers leave this placeholder when the final size is unknown.
+_UNKNOWN_SIZE = 0xFFFFFFFF
+
+
+class WavInfo(NamedTuple):
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def duration_sec(self) -> float:
+        bytes_per_sec = self.sample_rate * self.channels * (self.bits_per_sample // 8)
+        return self.data_size / bytes_per_sec if bytes_per_sec else 0.0
+
+
+def parse_wav_header(buf, total_size: Optional[int] = None) -> Optional[WavInfo]:
+    """Walk the RIFF chunk headers of a WAV buffer without touching the sample data.
+
+    Accepts bytes/bytearray/memoryview/mmap. Returns None if the buffer is not a WAV
+    with both `fmt ` and `data` chunks. The data size is clamped to the bytes actually
+    present, so truncated or streamed files report what can really be read. When `buf`
+    is only the head of a file, pass the file's `total_size` for the clamp.
+    """
+    total = len(buf)
+    if total < RIFF_HEADER_SIZE or bytes(buf[0:4]) != b"RIFF" or bytes(buf[8:12]) != b"WAVE":
+        return None
+    fmt = None
+    pos = RIFF_HEADER_SIZE
+    while pos + CHUNK_HEADER_SIZE <= total:
+        chunk_id = bytes(buf[pos:pos + 4])
+        (chunk_size,) = struct.unpack_from("<I", buf, pos + 4)
+        body = pos + CHUNK_HEADER_SIZE
+        if chunk_id == b"fmt " and body + 16 <= total:
+            _, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", buf, body)
+            fmt = (channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            available = (total if total_size is None else total_size) - body
+            size = available if chunk_size in (0, _UNKNOWN_SIZE) else min(chunk_size, available)
+            return WavInfo(fmt[0], fmt[1], fmt[2], body, size)
+        # Chunks are word-aligned: odd sizes carry one pad byte.
+        pos = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def read_wav_info(path: str, head_bytes: int = 64 * 1024) -> Optional[WavInfo]:
+    """Header info of a WAV file from its first `head_bytes` only; None if unreadable or not a WAV."""
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(head_bytes)
+    except OSError:
+        return None
+    return parse_wav_header(head, total_size=size)
+
+
+def peak_rms(path: str, info: WavInfo, start_sec: float = 0.0, window_ms: int = 30) -> Optional[float]:
+    """Loudest windowed RMS (0..1 of full scale) of a 16-bit PCM WAV file from `start_sec` on.
+
+    Returns None for other sample formats.
+    """
+    if info.bits_per_sample != 16:
+        return None
+    block_align = info.channels * 2
+    start = min(info.data_size, int(start_sec * info.sample_rate) * block_align)
+    with open(path, "rb") as f:
+        f.seek(info.data_offset + start)
+        raw = f.read(info.data_size - start)
+    samples = array("h")
+    samples.frombytes(raw[:len(raw) - len(raw) % 2])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    window = max(1, info.sample_rate * info.channels * window_ms // 1000)
+    peak = 0
+    for i in range(0, len(samples), window):
+        chunk = samples[i:i + window]
+        peak = max(peak, sum(s * s for s in chunk) / len(chunk))
+    return (peak ** 0.5) / 32768
+
+
+def build_wav(pcm: bytes, channels: int, sample_rate: int, bits_per_sample: int) -> bytes:
+    """Wrap raw PCM samples in a canonical 44-byte RIFF/WAVE header."""
+    block_align = channels * (bits_per_sample // 8)
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(pcm), b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits_per_sample,
+        b"data", len(pcm),
+    )
+    return header + pcm
+
+
+def concat_wavs(wavs, gap_ms: int = 0) -> bytes:
+    """Concatenate PCM WAVs of identical format into one WAV, with optional silence between them.
+
+    Raises ValueError if a buffer is not a WAV or the formats differ.
+    """
+    infos = [parse_wav_header(w) for w in wavs]
+    if not infos or any(info is None for info in infos):
+        raise ValueError("Not a WAV buffer")
+    channels, sample_rate, bits = infos[0].channels, infos[0].sample_rate, infos[0].bits_per_sample
+    if any((i.channels, i.sample_rate, i.bits_per_sample) != (channels, sample_rate, bits) for i in infos):
+        raise ValueError("Cannot concatenate WAVs with different formats")
+    block_align = channels * (bits // 8)
+    gap = b"\0" * (sample_rate * gap_ms // 1000 * block_align)
+    pcm = gap.join(bytes(memoryview(w)[i.data_offset:i.data_offset + i.data_size]) for w, i in zip(wavs, infos))
+    return build_wav(pcm, channels, sample_rate, bits)
+
+
+def slice_wav(buf, start_sec: float, end_sec: float) -> bytes:
+    """A new WAV with the samples between `start_sec` and `end_sec` (clamped to the audio, frame-aligned).
+
+    Raises ValueError if the buffer is not a WAV.
+    """
+    info = parse_wav_header(buf)
+    if info is None:
+        raise ValueError("Not a WAV buffer")
+    block_align = info.channels * (info.bits_per_sample // 8)
+    frames = info.data_size // block_align
+    start = min(frames, max(0, int(start_sec * info.sample_rate)))
+    end = min(frames, max(start, int(round(end_sec * info.sample_rate))))
+    offset = info.data_offset
+    pcm = bytes(memoryview(buf)[offset + start * block_align:offset + end * block_align])
+    return build_wav(pcm, info.channels, info.sample_rate, info.bits_per_sample)
@@ -1,66 +1,319 @@
-from fastapi import FastAPI, UploadFile, File, Form, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, Request, Body
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import tempfile
-import shutil
 import os
 import uuid
-from nodes.level_measurement import level_measurement
-from nodes.text_to_speech import text_to_speech
-from nodes.generate_plan import generate_plan
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from nodes.level_measurement import recognize_speech, score_session, GRANULARITIES
+from nodes.scoring import ANALYTICS_LEVELS, cohort_summary, score_results, score_results_captured, tokenize_reference
+from nodes.rescore import rescore_summary, submit_rescore
+from nodes.text_to_speech import text_to_speech, synthesize_words, write_audio
+from nodes.generate_plan import generate_plan, PLAN_MODES
+from nodes import voice_catalog
+from core import admission, executors, metrics, profiling, progress_store, result_cache, tts_pack
+from core.speech_endpoints import NoSpeechEndpoints, SpeechBackendError
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Each workload class gets its own pool so slow recognition sessions cannot starve TTS or /health.
+    executors.start()
+    if SCORING_EXECUTOR == "process":
+        # Spawn the scoring processes (and their imports) now rather than on the first assessments.
+        pool = executors.process_pool("scoring")
+        for _ in range(executors.PROCESS_POOL_WORKERS["scoring"]):
+            pool.submit(tokenize_reference, "")
+    try:
+        yield
+    finally:
+        executors.shutdown()
+        metrics.mark_process_dead()
+
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(profiling.profiling_middleware)
+app.middleware("http")(metrics.metrics_middleware)
 
 # Ensure and mount a public folder to serve generated files
 PUBLIC_DIR = os.path.join(os.path.dirname(__file__), "public")
 os.makedirs(PUBLIC_DIR, exist_ok=True)
 app.mount("/public", StaticFiles(directory=PUBLIC_DIR), name="public")
 
+# Assessment defaults per endpoint; both accept per-request overrides.
+FULL_ASSESSMENT = {"granularity": "phoneme", "enable_prosody_assessment": True, "enable_miscue": True, "analytics": "full"}
+WORD_ASSESSMENT = {"granularity": "word", "enable_prosody_assessment": False, "enable_miscue": True, "analytics": "basic"}
+# Batches default to basic analytics so a class's worth of results stays a reasonable payload.
+BATCH_ASSESSMENT = {**FULL_ASSESSMENT, "analytics": "basic"}
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+RESCORE_MAX_ITEMS = int(os.getenv("RESCORE_MAX_ITEMS", "5000"))
+# thread: score on the analytics threads; process: hand the raw results to the `scoring` process pool
+# (separate from /rescore's), so alignment and analytics run outside this worker's GIL.
+SCORING_EXECUTOR = os.getenv("SCORING_EXECUTOR", "thread").lower()
+
+@app.exception_handler(admission.Overloaded)
+def overloaded_handler(request: Request, exc: admission.Overloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "message": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(SpeechBackendError)
+def speech_backend_handler(request: Request, exc: SpeechBackendError):
+    # Every endpoint failed (502), or none is configured for the workload (503).
+    return JSONResponse(
+        status_code=503 if isinstance(exc, NoSpeechEndpoints) else 502,
+        content={"success": False, "message": str(exc)},
+    )
+
 @app.get("/health")
-def health():
+async def health():
     return {"status": "API is running"}
 
+@app.get("/metrics")
+def metrics_endpoint():
+    body, content_type = metrics.render_latest()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/cache/stats")
+def cache_stats_endpoint():
+    """Shared cache entries, bytes, hits/misses and evictions per namespace, across all workers."""
+    return result_cache.stats()
+
+def _assessment_options(defaults: dict, granularity, prosody, miscue, analytics):
+    """Merge per-request assessment knobs over endpoint defaults; returns (options, error message)."""
+    options = dict(defaults)
+    if granularity is not None:
+        options["granularity"] = granularity.lower()
+    if prosody is not None:
+        options["enable_prosody_assessment"] = prosody
+    if miscue is not None:
+        options["enable_miscue"] = miscue
+    if analytics is not None:
+        options["analytics"] = analytics.lower()
+    if options["granularity"] not in GRANULARITIES:
+        return None, f"granularity must be one of: {', '.join(GRANULARITIES)}"
+    if options["analytics"] not in ANALYTICS_LEVELS:
+        return None, f"analytics must be one of: {', '.join(ANALYTICS_LEVELS)}"
+    return options, None
+
+def _assess_upload(audio_file: UploadFile, reference_text: str, language: str, options: dict) -> tuple:
+    """Write the upload to a temp file and assess it, reusing cached results for identical submissions.
+
+    Returns (assessment key, result); the key identifies the submission (audio, reference and options).
+    """
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        tmp_audio_path = os.path.join(tmpdirname, os.path.basename(audio_file.filename or "audio.wav"))
+        with metrics.stage("level_measurement", "upload_write"):
+            with open(tmp_audio_path, "wb") as buffer:
+                audio_sha256 = result_cache.copy_and_hash(audio_file.file, buffer)
+
+        def compute():
+            with admission.acquire("speech_recognition"):
+                session = recognize_speech(
+                    tmp_audio_path, reference_text, language, options["granularity"],
+                    options["enable_prosody_assessment"], options["enable_miscue"],
+                )
+            scoring = executors.submit(
+                "analytics", _score, session, reference_text, language, options["enable_miscue"], options["analytics"],
+            )
+            return scoring.result()
+
+        key = result_cache.assessment_key(audio_sha256, reference_text, language, options)
+        if result_cache.ASSESSMENT_CACHE_ENABLED:
+            return key, result_cache.assessment_cache.get_or_compute(key, compute)
+        return key, compute()
+
+def _score(session: dict, reference_text: str, language: str, enable_miscue: bool, analytics: str) -> dict:
+    """Scoring stage on an analytics thread, profiled on its own: the request thread's profile only sees it waiting."""
+    with profiling.profiled("level_measurement_scoring"):
+        if SCORING_EXECUTOR == "process":
+            return _score_in_process(session["recognized_results_raw"], reference_text, language, enable_miscue, analytics)
+        return score_session(session, reference_text, language, enable_miscue, analytics)
+
+def _score_in_process(raw_results: list, reference_text: str, language: str, enable_miscue: bool, analytics: str) -> dict:
+    """Score on the process pool; the analytics thread only waits, so the executor still bounds the backlog."""
+    pool = executors.process_pool("scoring")
+    try:
+        result, stages = pool.submit(score_results_captured, raw_results, reference_text, language, enable_miscue, analytics).result()
+    except BrokenProcessPool as e:
+        # A worker process died; start a fresh pool for later requests and score this one on the thread.
+        metrics.record_error("scoring_process_pool", e)
+        executors.discard_process_pool("scoring", pool)
+        return score_results(raw_results, reference_text, language, enable_miscue, analytics)
+    metrics.replay_stages(stages)
+    return result
+
+def _measure(audio_file: UploadFile, reference_text: str, language: str, options: dict, learner_id: str | None = None):
+    with profiling.profiled("level_measurement"):
+        key, result = _assess_upload(audio_file, reference_text, language, options)
+        if learner_id and progress_store.PROGRESS_ENABLED:
+            # Progress is a side record: failing to store it must not fail the assessment.
+            # The key makes a retried upload (served from the cache) count once.
+            try:
+                with metrics.stage("level_measurement", "progress"):
+                    progress_store.progress_store.record(learner_id, reference_text, language, result, assessment_key=key)
+            except Exception as e:
+                metrics.record_error("learner_progress", e)
+        with metrics.stage("level_measurement", "serialization"):
+            return JSONResponse(content=result)
+
 @app.post("/level_measurement")
-def level_measurement_endpoint(
+async def level_measurement_endpoint(
     audio_file: UploadFile = File(...),
     reference_text: str = Form(...),
-    language: str = Form("en-US")
+    language: str = Form("en-US"),
+    granularity: str | None = Form(None),
+    prosody: bool | None = Form(None),
+    miscue: bool | None = Form(None),
+    analytics: str | None = Form(None),
+    learner_id: str | None = Form(None),
 ):
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        tmp_audio_path = os.path.join(tmpdirname, audio_file.filename)
-        with open(tmp_audio_path, "wb") as buffer:
-            shutil.copyfileobj(audio_file.file, buffer)
-        result = level_measurement(tmp_audio_path, reference_text, language)
-    return JSONResponse(content=result)
+    options, error = _assessment_options(FULL_ASSESSMENT, granularity, prosody, miscue, analytics)
+    if error:
+        return JSONResponse(status_code=400, content={"success": False, "message": error})
+    return await executors.run("recognition", _measure, audio_file, reference_text, language, options, learner_id)
 
 @app.post("/word_level_measurement")
-def word_level_measurement_endpoint(
+async def word_level_measurement_endpoint(
     audio_file: UploadFile = File(...),
     reference_text: str = Form(...),
-    language: str = Form("en-US")
+    language: str = Form("en-US"),
+    granularity: str | None = Form(None),
+    prosody: bool | None = Form(None),
+    miscue: bool | None = Form(None),
+    analytics: str | None = Form(None),
+    learner_id: str | None = Form(None),
 ):
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        tmp_audio_path = os.path.join(tmpdirname, audio_file.filename)
-        with open(tmp_audio_path, "wb") as buffer:
-            shutil.copyfileobj(audio_file.file, buffer)
-        result = level_measurement(tmp_audio_path, reference_text, language)
-    return JSONResponse(content=result)
+    """Lighter assessment for word drills: word granularity, no prosody, basic analytics by default."""
+    options, error = _assessment_options(WORD_ASSESSMENT, granularity, prosody, miscue, analytics)
+    if error:
+        return JSONResponse(status_code=400, content={"success": False, "message": error})
+    return await executors.run("recognition", _measure, audio_file, reference_text, language, options, learner_id)
+
+@app.post("/batch_level_measurement")
+async def batch_level_measurement_endpoint(
+    audio_files: list[UploadFile] = File(...),
+    reference_text: str = Form(...),
+    language: str = Form("en-US"),
+    granularity: str | None = Form(None),
+    prosody: bool | None = Form(None),
+    miscue: bool | None = Form(None),
+    analytics: str | None = Form(None),
+):
+    """Assess many recordings of one reference text and aggregate them as a cohort.
+
+    The reference's assessment config and tokenization are built once and shared; at most
+    BATCH_CONCURRENCY files are assessed at a time. A failed file is reported in its own entry.
+    """
+    options, error = _assessment_options(BATCH_ASSESSMENT, granularity, prosody, miscue, analytics)
+    if error:
+        return JSONResponse(status_code=400, content={"success": False, "message": error})
+    if len(audio_files) > BATCH_MAX_FILES:
+        return JSONResponse(status_code=400, content={"success": False, "message": f"At most {BATCH_MAX_FILES} audio files per batch."})
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def assess(audio_file: UploadFile):
+        async with semaphore:
+            try:
+                _, result = await executors.run("recognition", _assess_upload, audio_file, reference_text, language, options)
+                return {"filename": audio_file.filename, "success": True, "result": result}
+            except Exception as e:
+                metrics.record_error("batch_level_measurement", e)
+                return {"filename": audio_file.filename, "success": False, "message": str(e)}
+
+    entries = await asyncio.gather(*(assess(f) for f in audio_files))
+    with metrics.stage("batch_level_measurement", "cohort"):
+        cohort = cohort_summary([e["result"] for e in entries if e["success"]])
+    cohort["failed"] = sum(1 for e in entries if not e["success"])
+    return JSONResponse(content={
+        "success": True,
+        "reference_text": reference_text,
+        "language": language,
+        "results": entries,
+        "cohort": cohort,
+    })
+
+@app.get("/learners/{learner_id}/progress")
+def learner_progress_endpoint(learner_id: str, top_words: int = 10):
+    """Incrementally maintained progress of one learner (assessments sent with learner_id)."""
+    progress = progress_store.progress_store.progress(learner_id, top_words=max(1, min(top_words, 100)))
+    if progress is None:
+        return JSONResponse(status_code=404, content={"success": False, "message": f"No assessments for learner: {learner_id}"})
+    return progress
+
+@app.post("/rescore")
+async def rescore_endpoint(payload: dict = Body(...)):
+    """Rescore stored assessments from their raw recognition results, without calling the speech service.
+
+    Body: {"items": [{id?, reference_text, language?, enable_miscue?, raw_results | result}],
+    "scoring": {overrides of nodes.scoring.DEFAULT_SCORING}, "analytics": "none"}.
+    Items are scored in parallel on the shared process pool; the endpoint only awaits the
+    chunks, so a bulk job holds no executor thread.
+    """
+    items = payload.get("items")
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return JSONResponse(status_code=400, content={"success": False, "message": "items must be a list of objects."})
+    if len(items) > RESCORE_MAX_ITEMS:
+        return JSONResponse(status_code=400, content={"success": False, "message": f"At most {RESCORE_MAX_ITEMS} items per request."})
+    scoring = payload.get("scoring")
+    analytics = str(payload.get("analytics") or "none").lower()
+
+    pool = executors.process_pool("rescore")
+    try:
+        futures = submit_rescore(pool, items, scoring, analytics)
+        with metrics.stage("rescore", "scoring"):
+            chunks = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "message": str(e)})
+    except BrokenProcessPool as e:
+        # A worker process died; the next request gets a fresh pool.
+        metrics.record_error("rescore", e)
+        executors.discard_process_pool("rescore", pool)
+        return JSONResponse(status_code=503, content={"success": False, "message": "Rescoring workers failed; retry the request."})
+    entries = [entry for chunk in chunks for entry in chunk]
+    return JSONResponse(content={"success": True, "results": entries, "summary": rescore_summary(entries)})
 
 @app.post("/text_to_speach")
-def text_to_speach_endpoint(
+async def text_to_speach_endpoint(
     request: Request,
     text: str = Form(...),
     voice_name: str = Form(...),
-    language: str = Form("en-US")
+    language: str = Form("en-US"),
+    response_format: str = Form("json"),
+    long_text: bool | None = Form(None),
 ):
+    """Synthesize speech into public/.
+
+    response_format=json (default) returns the download URL; response_format=audio returns the
+    WAV itself (with X-Notq-Filename / X-Notq-Download-Url headers) so clients skip a second request.
+    long_text forces (true) or disables (false) sentence-chunked synthesis; by default long texts use it.
+    """
+    return await executors.run("synthesis", _text_to_speech_response, request, text, voice_name, language, response_format, long_text)
+
+def _text_to_speech_response(request: Request, text: str, voice_name: str, language: str, response_format: str, long_text: bool | None):
     filename = f"tts_{uuid.uuid4().hex}.wav"
     output_path = os.path.join(PUBLIC_DIR, filename)
-    result = text_to_speech(text=text, voice_name=voice_name, output_path=output_path, language=language)
+    # Synthesis takes its `tts` admission slots itself, only for cache misses (one per chunk of a long text).
+    with profiling.profiled("text_to_speech"):
+        result = text_to_speech(
+            text=text, voice_name=voice_name, output_path=output_path, language=language,
+            return_audio=response_format == "audio", long_text=long_text,
+        )
     if result.get("success") and os.path.exists(output_path):
         try:
             download_url = str(request.url_for("public", path=filename))
         except Exception:
             download_url = f"/public/{filename}"
+        if response_format == "audio":
+            return Response(
+                content=result["audio"],
+                media_type="audio/wav",
+                headers={"X-Notq-Filename": filename, "X-Notq-Download-Url": download_url},
+            )
         return JSONResponse(content={
             "success": True,
             "message": "Speech synthesized successfully.",
@@ -69,13 +322,104 @@ def text_to_speach_endpoint(
         })
     return JSONResponse(content=result, status_code=500)
 
+@app.post("/text_to_speach_words")
+async def text_to_speach_words_endpoint(
+    request: Request,
+    text: str = Form(...),
+    voice_name: str = Form(...),
+    language: str = Form("en-US"),
+):
+    """Synthesize a sentence once and split it into one clip per word (for pronunciation drills).
+
+    Returns the sentence's download URL and, per word, its text, timing in the sentence and clip URL.
+    """
+    return await executors.run("synthesis", _text_to_speech_words_response, request, text, voice_name, language)
+
+def _text_to_speech_words_response(request: Request, text: str, voice_name: str, language: str):
+    with profiling.profiled("text_to_speech"):
+        result = synthesize_words(text=text, voice_name=voice_name, language=language)
+    if not result.get("success"):
+        result.pop("audio", None)
+        return JSONResponse(content=result, status_code=500)
+
+    def public_url(filename: str) -> str:
+        try:
+            return str(request.url_for("public", path=filename))
+        except Exception:
+            return f"/public/{filename}"
+
+    stem = f"tts_{uuid.uuid4().hex}"
+    files = [(f"{stem}.wav", result["audio"])] + [(f"{stem}_w{i}.wav", w["audio"]) for i, w in enumerate(result["words"])]
+    try:
+        for filename, audio in files:
+            write_audio(os.path.join(PUBLIC_DIR, filename), audio)
+    except Exception as e:
+        metrics.record_error("text_to_speech", e)
+        return JSONResponse(content={"success": False, "message": f"Error during TTS: {str(e)}"}, status_code=500)
+    return JSONResponse(content={
+        "success": True,
+        "message": result["message"],
+        "filename": files[0][0],
+        "download_url": public_url(files[0][0]),
+        "words": [
+            {
+                "index": i,
+                "word": w["word"],
+                "text_offset": w["text_offset"],
+                "offset_sec": w["offset_sec"],
+                "duration_sec": w["duration_sec"],
+                "filename": files[i + 1][0],
+                "download_url": public_url(files[i + 1][0]),
+            }
+            for i, w in enumerate(result["words"])
+        ],
+    })
+
+@app.get("/voices")
+async def voices_endpoint(locale: str | None = None):
+    """Available TTS voices (optionally filtered by locale or language prefix) and per-locale defaults."""
+    # The first call may fetch the catalog from the speech service.
+    catalog = await executors.run("synthesis", voice_catalog.get_catalog)
+    return catalog.to_dict(locale)
+
+@app.get("/tts_packs")
+def tts_packs_endpoint():
+    return {"packs": tts_pack.list_packs()}
+
+@app.get("/tts_packs/{pack_name}")
+def tts_pack_index_endpoint(pack_name: str):
+    pack = tts_pack.get_pack(pack_name)
+    if pack is None:
+        return JSONResponse(status_code=404, content={"success": False, "message": f"Unknown pack: {pack_name}"})
+    return {"pack": pack_name, "entries": pack.entries}
+
+@app.get("/tts_packs/{pack_name}/{entry_id}")
+def tts_pack_entry_endpoint(pack_name: str, entry_id: str, request: Request):
+    """Serve one pre-synthesized clip from a memory-mapped pack, honouring single HTTP byte ranges."""
+    pack = tts_pack.get_pack(pack_name)
+    if pack is None or entry_id not in pack.entries:
+        return JSONResponse(status_code=404, content={"success": False, "message": "Unknown pack entry."})
+    length = pack.entries[entry_id]["length"]
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "public, max-age=86400"}
+    try:
+        byte_range = tts_pack.parse_range(request.headers.get("range"), length)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{length}"
+        return Response(status_code=416, headers=headers)
+    if byte_range is None:
+        return Response(content=pack.read(entry_id), media_type=pack.content_type, headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    return Response(content=pack.read(entry_id, start, end), status_code=206, media_type=pack.content_type, headers=headers)
+
 @app.post("/generate_plan")
-def generate_plan_endpoint(
+async def generate_plan_endpoint(
     system_prompt: str = Form(...),
     context: str = Form(...),
     objective: str = Form(...),
     constraints: str | None = Form(None),
     steps_hint: int | None = Form(None),
+    mode: str | None = Form(None),
 ):
     """Generate a structured plan using form fields like other endpoints.
 
@@ -85,20 +429,29 @@ def generate_plan_endpoint(
     - objective: Optional objective string
     - constraints: Optional string; can be JSON list, newline- or comma-separated
     - steps_hint: Optional integer suggesting approximate number of steps
+    - mode: Optional output mode, "structured" (native JSON schema) or "prompt"
     """
+    if mode is not None and mode.lower() not in PLAN_MODES:
+        return JSONResponse(status_code=400, content={"success": False, "message": f"mode must be one of: {', '.join(PLAN_MODES)}"})
 
     constraints_list = None
     if constraints:
         parts = [s.strip() for s in constraints.split(",") if s.strip()]
         constraints_list = parts if parts else None
 
-    result = generate_plan(
-        system_prompt=system_prompt,
-        context=context,
-        objective=objective,
-        constraints=constraints_list,
-        steps_hint=steps_hint,
-    )
+    def run_plan():
+        # The LLM call takes its `llm` admission slot itself, after the plan cache lookup.
+        with profiling.profiled("generate_plan"):
+            return generate_plan(
+                system_prompt=system_prompt,
+                context=context,
+                objective=objective,
+                constraints=constraints_list,
+                steps_hint=steps_hint,
+                mode=mode,
+            )
+
+    result = await executors.run("llm", run_plan)
     
     status = 200 if result.get("success") else 500
     
@@ -1,4 +1,5 @@
 import os
+import re
 import json
 from typing import List, Optional
 from dotenv import load_dotenv
@@ -8,6 +9,14 @@ from langchain_core.output_parsers import PydanticOutputParser
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.prompts import PromptTemplate
+from core import admission, metrics, result_cache
+from core.admission import Overloaded
+
+# "structured": the model's native JSON-schema output constrained to `Plan` (no schema text in the prompt).
+# "prompt": schema format instructions in the prompt, free text parsed afterwards.
+PLAN_MODES = ("structured", "prompt")
+PLAN_OUTPUT_MODE = os.getenv("PLAN_OUTPUT_MODE", "structured").lower()
+PLAN_MODEL = "gemini-2.5-flash"
 
 class PlanStep(BaseModel):
     id: int = Field(..., description="Sequential step id starting at 1.")
@@ -36,7 +45,78 @@ def _get_llm(temperature: float = 0.2):
     load_dotenv()
     if not os.getenv("GOOGLE_API_KEY"):
         raise ValueError("Missing GOOGLE_API_KEY for Gemini.")
-    return ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=temperature)
+    return ChatGoogleGenerativeAI(model=PLAN_MODEL, temperature=temperature)
+
+
+def _message_text(message) -> str:
+    content = getattr(message, "content", message)
+    if isinstance(content, list):
+        return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+    return content or ""
+
+
+def _close_json(text: str) -> str:
+    """Cut `text` to its first JSON object, dropping trailing commas and closing whatever was left open."""
+    out = []
+    stack = []
+    in_string = escaped = False
+    for ch in text[text.find("{"):]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            out.append(ch)
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            while out and out[-1] in " \t\r\n,":
+                out.pop()
+            if not stack or stack.pop() != ch:
+                break
+            if not stack:
+                out.append(ch)
+                return "".join(out)
+        out.append(ch)
+
+    # Truncated output: finish the open string, drop a dangling separator, close the brackets.
+    if in_string:
+        out.append('"')
+    tail = "".join(out).rstrip().rstrip(",")
+    if tail.endswith(":"):
+        tail += " null"
+    return tail + "".join(reversed(stack))
+
+
+def repair_plan(text: str) -> Optional[Plan]:
+    """Best-effort local repair of near-valid plan JSON (code fences, trailing commas, truncation).
+
+    Returns None when the text cannot be turned into a valid `Plan`.
+    """
+    text = re.sub(r"^\s*```(?:json)?|```\s*$", "", text or "").strip()
+    if "{" not in text:
+        return None
+    try:
+        return Plan.model_validate(json.loads(_close_json(text)))
+    except ValueError:
+        return None
+
+
+def _repaired_or_raise(text: str, error: Exception) -> Plan:
+    with metrics.stage("generate_plan", "repair"):
+        plan = repair_plan(text)
+    metrics.PLAN_REPAIRS.labels(outcome="repaired" if plan else "failed").inc()
+    if plan is None:
+        metrics.PLAN_PARSE_FAILURES.inc()
+        raise error
+    return plan
 
 
 def generate_plan(
@@ -45,21 +125,30 @@ def generate_plan(
     objective: Optional[str] = None,
     constraints: Optional[List[str]] = None,
     steps_hint: Optional[int] = None,
+    mode: Optional[str] = None,
 ):
     """Generate a structured plan from a system prompt and long-form context using LangChain.
 
+    `mode` is one of PLAN_MODES (default PLAN_OUTPUT_MODE). Output that fails to parse goes
+    through a local JSON repair pass before the call is counted as failed.
+
     Returns a dict: { success, message, plan (parsed), raw }.
     """
     try:
+        mode = (mode or PLAN_OUTPUT_MODE).lower()
+        if mode not in PLAN_MODES:
+            raise ValueError(f"mode must be one of: {', '.join(PLAN_MODES)}")
         parser = PydanticOutputParser(pydantic_object=Plan)
+        # Structured output carries the schema out of band, so the prompt skips the schema text.
+        schema_section = "" if mode == "structured" else """
+                Schema instructions:
+                {format_instructions}
+                """
 
         prompt = PromptTemplate(
             template="""
                 {system_instructions}
-                
-                Schema instructions:
-                {format_instructions}
-                
+                """ + schema_section + """
                 Context (for grounding):
                 {context}
                 
@@ -77,23 +166,50 @@ def generate_plan(
                 "context": context,
                 "objective": objective,
                 "extra_constraints": "\n".join(constraints or []) or "",
-                "format_instructions": parser.get_format_instructions(),
+                **({} if mode == "structured" else {"format_instructions": parser.get_format_instructions()}),
                 "steps_hint": f"Aim for approximately {steps_hint} steps." if steps_hint else ""
             },
         )
 
-        llm = _get_llm(temperature=0.2)
+        def compute() -> dict:
+            llm = _get_llm(temperature=0.2)
+            if mode == "structured":
+                chain = prompt | llm.with_structured_output(Plan, method="json_schema", include_raw=True)
+                with admission.acquire("llm"), metrics.stage("generate_plan", "llm"):
+                    output = chain.invoke({})
+                result = output["parsed"]
+                if result is None:
+                    result = _repaired_or_raise(_message_text(output["raw"]), output["parsing_error"] or ValueError("Empty plan output."))
+            else:
+                chain = prompt | llm
+                with admission.acquire("llm"), metrics.stage("generate_plan", "llm"):
+                    message = chain.invoke({})
+                try:
+                    with metrics.stage("generate_plan", "parse"):
+                        result = parser.invoke(message)
+                except Exception as e:
+                    result = _repaired_or_raise(_message_text(message), e)
+            return result.dict()
 
-        chain = prompt | llm | parser
-        
-        result = chain.invoke({})
+        # Identical requests (same prompt, inputs, mode and model) reuse a plan generated by any worker.
+        if result_cache.PLAN_CACHE_ENABLED:
+            key = result_cache.content_key(
+                system_prompt=system_prompt, context=context, objective=objective, constraints=constraints or [],
+                steps_hint=steps_hint, mode=mode, model=PLAN_MODEL,
+            )
+            plan = result_cache.plan_cache.get_or_compute(key, compute)
+        else:
+            plan = compute()
 
         return {
             "success": True,
             "message": "Plan generated successfully.",
-            "plan": result.dict(),
+            "plan": plan,
         }
+    except Overloaded:
+        raise
     except Exception as e:
+        metrics.record_error("generate_plan", e)
         return {
             "success": False,
             "message": f"Failed to generate plan: {e}",
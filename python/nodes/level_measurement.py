@@ -1,121 +1,161 @@
 import os
 import time
-import string
-import difflib
 import json
-import statistics
+from functools import lru_cache
+from typing import Optional
 from dotenv import load_dotenv
 import azure.cognitiveservices.speech as speechsdk
-
-def level_measurement(audio_file: str, reference_text: str, language: str = 'en-US'):
+from core import metrics, speech_endpoints, wav
+from core.speech_endpoints import SpeechBackendError
+from nodes.scoring import score_results
+
+load_dotenv()
+
+GRANULARITIES = {
+    'phoneme': speechsdk.PronunciationAssessmentGranularity.Phoneme,
+    'word': speechsdk.PronunciationAssessmentGranularity.Word,
+    'fulltext': speechsdk.PronunciationAssessmentGranularity.FullText,
+}
+
+# adaptive: WAV clips up to SINGLE_SHOT_MAX_SEC use one recognize_once call, falling back to a continuous
+# session when the utterance stops before the audio does; continuous: always a continuous session.
+RECOGNITION_MODE = os.getenv("RECOGNITION_MODE", "adaptive").lower()
+SINGLE_SHOT_MAX_SEC = float(os.getenv("SINGLE_SHOT_MAX_SEC", "10"))
+# Audio left after the recognized utterance is accepted if it is this short, or quieter than this RMS (0..1).
+SINGLE_SHOT_TAIL_SEC = float(os.getenv("SINGLE_SHOT_TAIL_SEC", "0.5"))
+SINGLE_SHOT_SILENCE_RMS = float(os.getenv("SINGLE_SHOT_SILENCE_RMS", "0.02"))
+
+
+def level_measurement(audio_file: str, reference_text: str, language: str = 'en-US',
+                      granularity: str = 'phoneme', enable_prosody_assessment: bool = True,
+                      enable_miscue: bool = True, analytics: str = 'full'):
     """
     Performs continuous pronunciation assessment asynchronously with input from an audio file.
     Returns a dictionary with all measurement results.
+
+    `granularity`, `enable_prosody_assessment` and `enable_miscue` control what the speech service
+    assesses; `analytics` (one of ANALYTICS_LEVELS) controls how much of the analytics payload is built.
     """
-    load_dotenv()
-    subscription_key = os.getenv('AZURE_SPEECH_KEY_LEVEL_MEASUREMENT')
-    service_region = os.getenv('AZURE_SPEECH_REGION_LEVEL_MEASUREMENT')
+    session = recognize_speech(audio_file, reference_text, language, granularity, enable_prosody_assessment, enable_miscue)
+    return score_session(session, reference_text, language, enable_miscue, analytics)
 
-    speech_config = speechsdk.SpeechConfig(subscription=subscription_key, region=service_region)
-    audio_config = speechsdk.audio.AudioConfig(filename=audio_file)
 
-    enable_miscue = True
-    enable_prosody_assessment = True
-    pronunciation_config = speechsdk.PronunciationAssessmentConfig(
+def recognize_speech(audio_file: str, reference_text: str, language: str = 'en-US',
+                     granularity: str = 'phoneme', enable_prosody_assessment: bool = True,
+                     enable_miscue: bool = True) -> dict:
+    """Recognition stage: run the pronunciation-assessment session (I/O bound, mostly waiting on the service).
+
+    Short WAV clips take the single-shot path in adaptive mode; the session has the same shape either way.
+    """
+    config_json = assessment_config_json(reference_text, granularity, enable_miscue, enable_prosody_assessment)
+    endpoints = speech_endpoints.pool('LEVEL_MEASUREMENT', default_hedge_after_sec=15.0)
+
+    # Only the RIFF header is read here; non-WAV uploads have no cheap duration and stay continuous.
+    info = wav.read_wav_info(audio_file) if RECOGNITION_MODE == 'adaptive' else None
+    if info is not None and 0 < info.duration_sec <= SINGLE_SHOT_MAX_SEC:
+        session = endpoints.call(lambda endpoint: _recognize(endpoint.speech_config(), audio_file, language, config_json, single_shot=True))
+        if _single_shot_covers(session, audio_file, info):
+            metrics.RECOGNITION_PATHS.labels(path="single_shot").inc()
+            return session
+        metrics.RECOGNITION_PATHS.labels(path="single_shot_fallback").inc()
+    else:
+        metrics.RECOGNITION_PATHS.labels(path="continuous").inc()
+    return endpoints.call(lambda endpoint: _recognize(endpoint.speech_config(), audio_file, language, config_json))
+
+
+def _single_shot_covers(session: dict, audio_file: str, info: wav.WavInfo) -> bool:
+    """Whether a single-shot result covers the clip: recognize_once stops at the first pause, so any
+    speech after the recognized utterance means the clip needs a continuous session."""
+    ends = [int(w.get('Offset', 0)) + int(w.get('Duration', 0))
+            for jo in session['recognized_results_raw']
+            for w in ((jo.get('NBest') or [{}])[0].get('Words') or [])]
+    if not ends:
+        return False
+    end_sec = max(ends) / 10_000_000
+    if info.duration_sec - end_sec <= SINGLE_SHOT_TAIL_SEC:
+        return True
+    # Skip a little past the last word so its decay does not count as more speech.
+    peak = wav.peak_rms(audio_file, info, end_sec + 0.2)
+    return peak is not None and peak < SINGLE_SHOT_SILENCE_RMS
+
+
+@lru_cache(maxsize=256)
+def assessment_config_json(reference_text: str, granularity: str = 'phoneme', enable_miscue: bool = True,
+                           enable_prosody_assessment: bool = True) -> str:
+    """Pronunciation-assessment config as JSON, built once per reference/options and shared across sessions."""
+    config = speechsdk.PronunciationAssessmentConfig(
         reference_text=reference_text,
         grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
-        granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme,
+        granularity=GRANULARITIES[granularity],
         enable_miscue=enable_miscue)
     if enable_prosody_assessment:
-        pronunciation_config.enable_prosody_assessment()
+        config.enable_prosody_assessment()
+    return config.to_json()
+
+
+def score_session(session: dict, reference_text: str, language: str = 'en-US',
+                  enable_miscue: bool = True, analytics: str = 'full', scoring: Optional[dict] = None) -> dict:
+    """Scoring stage: score a recognition session's raw results (see nodes.scoring.score_results)."""
+    return score_results(session['recognized_results_raw'], reference_text, language, enable_miscue, analytics, scoring)
+
+
+def _recognize(speech_config, audio_file: str, language: str, config_json: str, single_shot: bool = False):
+    """
+    Runs one pronunciation assessment session against a single speech endpoint: continuous by default,
+    or a single `recognize_once` utterance when `single_shot` (no session callbacks or polling).
+    Returns the service's raw JSON result per segment; raises SpeechBackendError if the service cancels with an error.
+    """
+    audio_config = speechsdk.audio.AudioConfig(filename=audio_file)
+
+    pronunciation_config = speechsdk.PronunciationAssessmentConfig(json_string=config_json)
 
     speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, language=language, audio_config=audio_config)
     pronunciation_config.apply_to(speech_recognizer)
 
     done = False
-    recognized_words = []
-    fluency_scores = []
-    prosody_scores = []
-    durations = []  # per recognized segment total word duration (ticks)
-    recognized_segments = []  # store NBest[0] per segment for deep analysis
-    recognized_results_raw = []  # full JSON results per segment
-    segment_summaries = []  # summary per segment: text, confidence, scores, times
-    transcripts_display = []
-    transcripts_lexical = []
-    recognized_json_words = []  # flattened words for timeline
+    recognized_results_raw = []  # full JSON results per segment; scoring derives everything else from these
+    cancellation_error = None
 
     def stop_cb(evt: speechsdk.SessionEventArgs):
         nonlocal done
         done = True
 
+    def canceled_cb(evt: speechsdk.SpeechRecognitionCanceledEventArgs):
+        nonlocal done, cancellation_error
+        details = evt.cancellation_details
+        if details.reason == speechsdk.CancellationReason.Error:
+            cancellation_error = f"Recognition canceled: {details.reason}. Error: {details.error_details}"
+        done = True
+
     def recognized(evt: speechsdk.SpeechRecognitionEventArgs):
-        pronunciation_result = speechsdk.PronunciationAssessmentResult(evt.result)
-        nonlocal recognized_words, fluency_scores, durations, prosody_scores
-        recognized_words += pronunciation_result.words
+        collect(evt.result)
 
-        # Align one duration per recognized result; default to 0 when not present
-        dur = 0
+    def collect(result: speechsdk.SpeechRecognitionResult):
+        json_result = result.properties.get(speechsdk.PropertyId.SpeechServiceResponse_JsonResult)
         try:
-            json_result = evt.result.properties.get(speechsdk.PropertyId.SpeechServiceResponse_JsonResult)
-            if json_result:
-                jo = json.loads(json_result)
-                recognized_results_raw.append(jo)
-                nbest_list = jo.get('NBest', [])
-                nb = nbest_list[0] if nbest_list else {}
-                words = nb.get('Words', [])
-                # Persist segment and words for post-analysis
-                recognized_segments.append(nb)
-                recognized_json_words.extend(words)
-                dur = sum(int(w.get('Duration', 0)) for w in words if isinstance(w.get('Duration', 0), (int, str)))
-
-                # Segment summary
-                seg_text_display = nb.get('Display') or nb.get('Lexical') or nb.get('Text')
-                seg_text_lexical = nb.get('Lexical') or nb.get('Text') or seg_text_display
-                transcripts_display.append(seg_text_display or '')
-                transcripts_lexical.append(seg_text_lexical or '')
-                seg_conf = nb.get('Confidence')
-                seg_flu = pronunciation_result.fluency_score if pronunciation_result.fluency_score is not None else None
-                seg_pros = pronunciation_result.prosody_score if pronunciation_result.prosody_score is not None else None
-                # Approx segment times
-                seg_offset = min((int(w.get('Offset', 0)) for w in words), default=0)
-                seg_end = max(((int(w.get('Offset', 0)) + int(w.get('Duration', 0))) for w in words), default=0)
-                segment_summaries.append({
-                    'display': seg_text_display,
-                    'lexical': seg_text_lexical,
-                    'confidence': seg_conf,
-                    'fluency_score': seg_flu,
-                    'prosody_score': seg_pros,
-                    'offset_sec': seg_offset / 10_000_000 if seg_offset else 0.0,
-                    'end_sec': seg_end / 10_000_000 if seg_end else 0.0,
-                    'duration_sec': ((seg_end - seg_offset) / 10_000_000) if (seg_end and seg_offset and seg_end >= seg_offset) else (dur / 10_000_000),
-                    'alternatives': [
-                        {
-                            'display': alt.get('Display') or alt.get('Lexical') or alt.get('Text'),
-                            'lexical': alt.get('Lexical') or alt.get('Text'),
-                            'confidence': alt.get('Confidence'),
-                        }
-                        for alt in nbest_list[:5]
-                    ] if nbest_list else []
-                })
-        except Exception:
-            dur = 0
-        durations.append(dur)
-
-        # Guard None values for scores; ensure list lengths match durations
-        fs = pronunciation_result.fluency_score if pronunciation_result.fluency_score is not None else 0.0
-        fluency_scores.append(fs)
-        if pronunciation_result.prosody_score is not None:
-            prosody_scores.append(pronunciation_result.prosody_score)
-
-    speech_recognizer.recognized.connect(recognized)
-    speech_recognizer.session_stopped.connect(stop_cb)
-    speech_recognizer.canceled.connect(stop_cb)
+            recognized_results_raw.append(json.loads(json_result) if json_result else {})
+        except ValueError:
+            recognized_results_raw.append({})
 
     try:
-        speech_recognizer.start_continuous_recognition()
-        while not done:
-            time.sleep(.2)
-        speech_recognizer.stop_continuous_recognition()
+        if single_shot:
+            with metrics.stage("level_measurement", "recognizer_once"):
+                result = speech_recognizer.recognize_once_async().get()
+            if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+                collect(result)
+            elif result.reason == speechsdk.ResultReason.Canceled:
+                details = result.cancellation_details
+                if details.reason == speechsdk.CancellationReason.Error:
+                    cancellation_error = f"Recognition canceled: {details.reason}. Error: {details.error_details}"
+        else:
+            speech_recognizer.recognized.connect(recognized)
+            speech_recognizer.session_stopped.connect(stop_cb)
+            speech_recognizer.canceled.connect(canceled_cb)
+            with metrics.stage("level_measurement", "recognizer_session"):
+                speech_recognizer.start_continuous_recognition()
+                while not done:
+                    time.sleep(.2)
+                speech_recognizer.stop_continuous_recognition()
     finally:
         # Best-effort cleanup to release file handles on Windows
         try:
@@ -134,247 +174,8 @@ def level_measurement(audio_file: str, reference_text: str, language: str = 'en-
         speech_recognizer = None
         audio_config = None
 
-    if language == 'zh-CN':
-        import jieba
-        import zhon.hanzi
-        jieba.suggest_freq([x.word for x in recognized_words], True)
-        reference_words = [w for w in jieba.cut(reference_text) if w not in zhon.hanzi.punctuation]
-    else:
-        reference_words = [w.strip(string.punctuation) for w in reference_text.lower().split()]
-
-    if enable_miscue:
-        diff = difflib.SequenceMatcher(None, reference_words, [x.word.lower() for x in recognized_words])
-        final_words = []
-        for tag, i1, i2, j1, j2 in diff.get_opcodes():
-            if tag in ['insert', 'replace']:
-                for word in recognized_words[j1:j2]:
-                    if word.error_type == 'None':
-                        word._error_type = 'Insertion'
-                    final_words.append(word)
-            if tag in ['delete', 'replace']:
-                for word_text in reference_words[i1:i2]:
-                    word = speechsdk.PronunciationAssessmentWordResult({
-                        'Word': word_text,
-                        'PronunciationAssessment': {
-                            'ErrorType': 'Omission',
-                        }
-                    })
-                    final_words.append(word)
-            if tag == 'equal':
-                final_words += recognized_words[j1:j2]
-    else:
-        final_words = recognized_words
-
-    final_accuracy_scores = [word.accuracy_score for word in final_words if word.error_type != 'Insertion']
-    accuracy_score = sum(final_accuracy_scores) / len(final_accuracy_scores) if final_accuracy_scores else 0
-    fluency_score = sum(x * y for (x, y) in zip(fluency_scores, durations)) / sum(durations) if durations and sum(durations) > 0 else 0
-    completeness_score = len([w for w in recognized_words if w.error_type == "None"]) / len(reference_words) * 100 if reference_words else 0
-    completeness_score = completeness_score if completeness_score <= 100 else 100
-    numeric_prosody = [ps for ps in prosody_scores if isinstance(ps, (int, float))]
-    prosody_score = sum(numeric_prosody) / len(numeric_prosody) if numeric_prosody else 0
-
-    # Re-normalize weights if prosody is unavailable (keeps response fields but avoids unfairly penalizing)
-    weights = {"accuracy": 0.4, "prosody": 0.2, "fluency": 0.2, "completeness": 0.2}
-    components = {
-        "accuracy": accuracy_score,
-        "prosody": prosody_score if numeric_prosody else None,
-        "fluency": fluency_score,
-        "completeness": completeness_score,
-    }
-    active = {k: v for k, v in components.items() if v is not None}
-    total_w = sum(weights[k] for k in active.keys())
-    pron_score = sum(active[k] * (weights[k] / total_w) for k in active.keys()) if total_w > 0 else 0
-
-    word_results = [
-        {
-            'word': word.word,
-            'accuracy_score': word.accuracy_score,
-            'error_type': word.error_type
-        }
-        for word in final_words
-    ]
-
-    # Compute additional analytics
-    insertion_count = len([w for w in final_words if w.error_type == 'Insertion'])
-    omission_count = len([w for w in final_words if w.error_type == 'Omission'])
-    mispronunciation_count = len([w for w in final_words if w.error_type == 'Mispronunciation'])
-    correct_count = len([w for w in final_words if w.error_type == 'None'])
-    total_ref = len(reference_words)
-    wer = ((mispronunciation_count + omission_count + insertion_count) / total_ref) * 100 if total_ref else 0
-
-    # Build per-word timeline using offsets/durations from JSON when available
-    TICKS_PER_SECOND = 10_000_000
-    def to_sec(ticks):
-        try:
-            return int(ticks) / TICKS_PER_SECOND
-        except Exception:
-            return 0.0
-
-    timeline = []
-    for w in recognized_json_words:
-        pa = (w.get('PronunciationAssessment') or {}) if isinstance(w, dict) else {}
-        timeline.append({
-            'word': w.get('Word'),
-            'offset_sec': to_sec(w.get('Offset', 0)),
-            'duration_sec': to_sec(w.get('Duration', 0)),
-            'end_sec': to_sec(int(w.get('Offset', 0)) + int(w.get('Duration', 0)) if str(w.get('Offset', '0')).isdigit() and str(w.get('Duration', '0')).isdigit() else 0),
-            'accuracy_score': pa.get('AccuracyScore'),
-            'error_type': pa.get('ErrorType'),
-            # Include syllables/phonemes raw details when present (shape varies by locale)
-            'syllables': w.get('Syllables'),
-        })
-
-    if timeline:
-        span_start = min(item['offset_sec'] for item in timeline)
-        span_end = max(item['end_sec'] for item in timeline)
-        span_duration_sec = max(span_end - span_start, 0.0)
-    else:
-        span_duration_sec = 0.0
-
-    speech_time_sec = sum(to_sec(d) for d in durations)
-    words_count = len([w for w in recognized_json_words if isinstance(w, dict)])
-    wpm_span = (words_count / span_duration_sec * 60.0) if span_duration_sec > 0 else 0.0
-    wpm_articulation = (words_count / speech_time_sec * 60.0) if speech_time_sec > 0 else 0.0
-
-    # Detect silence segments between timeline words
-    silences = []
-    if len(timeline) >= 2:
-        timeline_sorted = sorted(timeline, key=lambda x: x['offset_sec'])
-        for prev, nxt in zip(timeline_sorted, timeline_sorted[1:]):
-            gap = max(nxt['offset_sec'] - prev['end_sec'], 0.0)
-            if gap > 0:
-                silences.append({
-                    'start_sec': prev['end_sec'],
-                    'end_sec': nxt['offset_sec'],
-                    'duration_sec': gap,
-                })
-
-    # Aggregate per unique word (case-insensitive)
-    per_word = {}
-    for item in timeline:
-        key = (item['word'] or '').lower()
-        if not key:
-            continue
-        agg = per_word.setdefault(key, {
-            'occurrences': 0,
-            'avg_accuracy': None,
-            'min_accuracy': None,
-            'max_accuracy': None,
-            'total_duration_sec': 0.0,
-        })
-        acc = item.get('accuracy_score')
-        agg['occurrences'] += 1
-        agg['total_duration_sec'] += item.get('duration_sec') or 0.0
-        if isinstance(acc, (int, float)):
-            if agg['avg_accuracy'] is None:
-                agg['avg_accuracy'] = acc
-                agg['min_accuracy'] = acc
-                agg['max_accuracy'] = acc
-            else:
-                # running average
-                agg['avg_accuracy'] = (agg['avg_accuracy'] * (agg['occurrences'] - 1) + acc) / agg['occurrences']
-                agg['min_accuracy'] = min(agg['min_accuracy'], acc)
-                agg['max_accuracy'] = max(agg['max_accuracy'], acc)
-
-    # Accuracy distribution buckets
-    def bucket(score):
-        try:
-            s = float(score)
-        except Exception:
-            return 'unknown'
-        if s < 60:
-            return '<60'
-        if s < 80:
-            return '60-79'
-        if s < 90:
-            return '80-89'
-        if s < 100:
-            return '90-99'
-        return '100'
-
-    acc_buckets = {}
-    for w in timeline:
-        b = bucket(w.get('accuracy_score'))
-        acc_buckets[b] = acc_buckets.get(b, 0) + 1
-
-    # Compute an overall delay score using fluency, completeness, and silence
-    total_silence_sec = sum(s.get('duration_sec', 0.0) for s in silences) if 'silences' in locals() else 0.0
-    silence_ratio = (total_silence_sec / span_duration_sec) if span_duration_sec > 0 else 0.0
-    fluency_norm = max(0.0, min(1.0, fluency_score / 100.0))
-    completeness_norm = max(0.0, min(1.0, completeness_score / 100.0))
-    # Composite delay index: higher means more delay
-    delay_index = 0.5 * (1.0 - fluency_norm) + 0.3 * silence_ratio + 0.2 * (1.0 - completeness_norm)
-
-    levels_map = {
-        0: 'natural',
-        1: 'slight delay',
-        2: 'Medium delay',
-        3: 'severe delay',
-    }
-    if delay_index < 0.20:
-        level_code = 0
-    elif delay_index < 0.35:
-        level_code = 1
-    elif delay_index < 0.55:
-        level_code = 2
-    else:
-        level_code = 3
-
-    # Final 1-10 score (higher is better). Combine inverse delay with accuracy and fluency.
-    # Clamp in [1,10] and round to nearest int.
-    inv_delay = max(0.0, min(1.0, 1.0 - delay_index))
-    acc_norm = max(0.0, min(1.0, accuracy_score / 100.0))
-    flu_norm = max(0.0, min(1.0, fluency_score / 100.0))
-    quality = 0.5 * inv_delay + 0.25 * acc_norm + 0.25 * flu_norm
-    score = int(round(1 + (max(0.0, min(1.0, quality)) * 9)))
-
-    return {
-        'level_measured': level_code,
-        'levels': levels_map,
-        'score': score,
-        # Backward-compatible top-level scores
-        'paragraph_pronunciation_score': pron_score,
-        'accuracy_score': accuracy_score,
-        'completeness_score': completeness_score,
-        'fluency_score': fluency_score,
-        'prosody_score': prosody_score,
-        'words': word_results,
+    if cancellation_error:
+        # Connection/auth/quota failures: let the endpoint pool fail over to another region.
+        raise SpeechBackendError(cancellation_error)
 
-        # New detailed analytics
-        'analytics': {
-            'word_error_rate_percent': wer,
-            'counts': {
-                'reference_word_count': total_ref,
-                'recognized_word_count': len(recognized_words),
-                'correct': correct_count,
-                'insertions': insertion_count,
-                'omissions': omission_count,
-                'mispronunciations': mispronunciation_count,
-            },
-            'speaking_rates': {
-                'wpm_overall_span': wpm_span,
-                'wpm_articulation_time': wpm_articulation,
-                'total_span_duration_sec': span_duration_sec,
-                'total_articulation_time_sec': speech_time_sec,
-            },
-            'accuracy_distribution': acc_buckets,
-            'timeline': timeline,
-            'silences': silences,
-            'per_word': per_word,
-            'transcripts': {
-                'display': transcripts_display,
-                'lexical': transcripts_lexical,
-            },
-            'segments': recognized_segments,
-            'segment_summaries': segment_summaries,
-            'raw': {
-                'results': recognized_results_raw,
-            },
-            'summary': {
-                'timeline_word_count': words_count,
-                'timeline_span_sec': span_duration_sec,
-                'avg_word_duration_sec': (speech_time_sec / words_count) if words_count else 0.0,
-                'median_word_duration_sec': (statistics.median([w.get('duration_sec') or 0.0 for w in timeline]) if timeline else 0.0),
-            }
-        }
-    }
+    return {'recognized_results_raw': recognized_results_raw}
@@ -0,0 +1,164 @@
+"""Offline rescoring of stored assessments.
+
+Scoring is a pure function of the speech service's raw JSON results (`analytics.raw.results`
+in a `full` assessment) and the reference text, so stored assessments can be rescored with new
+weights without sending any audio to the speech service again.
+
+Input is a JSON list or JSON lines of items:
+
+    {"id": "...", "reference_text": "...", "language": "en-US", "enable_miscue": true,
+     "raw_results": [...]}          # or "result": <a stored /level_measurement response>
+
+    python -m nodes.rescore stored.jsonl rescored.jsonl --scoring scoring.json --workers 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional
+
+from core import metrics
+from nodes.scoring import ANALYTICS_LEVELS, score_results, scoring_config
+
+# Items per task sent to a worker process; large enough to amortize pickling, small enough to balance.
+RESCORE_CHUNK_SIZE = int(os.getenv("RESCORE_CHUNK_SIZE", "50"))
+
+
+def raw_results_of(item: dict) -> Optional[list]:
+    """The raw recognition results of an item, given directly or inside a stored assessment."""
+    if isinstance(item.get("raw_results"), list):
+        return item["raw_results"]
+    raw = (((item.get("result") or {}).get("analytics") or {}).get("raw") or {}).get("results")
+    return raw if isinstance(raw, list) else None
+
+
+def rescore_item(item: dict, scoring: Optional[dict] = None, analytics: str = "none") -> dict:
+    """Rescore one item; failures are reported in the entry rather than raised."""
+    entry = {"id": item.get("id")}
+    raw_results = raw_results_of(item)
+    if raw_results is None:
+        return {**entry, "success": False, "message": "No raw results; store assessments made with analytics=full."}
+    if not item.get("reference_text"):
+        return {**entry, "success": False, "message": "reference_text is required."}
+    try:
+        result = score_results(
+            raw_results, item["reference_text"], item.get("language", "en-US"),
+            item.get("enable_miscue", True), analytics, scoring,
+        )
+    except Exception as e:
+        return {**entry, "success": False, "message": str(e)}
+    entry.update(success=True, result=result)
+    previous = item.get("result")
+    if isinstance(previous, dict):
+        entry["previous"] = {
+            "score": previous.get("score"),
+            "level_measured": previous.get("level_measured"),
+            "paragraph_pronunciation_score": previous.get("paragraph_pronunciation_score"),
+        }
+    return entry
+
+
+def _rescore_chunk(items: list, scoring: Optional[dict], analytics: str) -> list:
+    # Capture and drop score_results' stage timings: offline scoring must not land in the live
+    # level_measurement histograms (rescore workers share PROMETHEUS_MULTIPROC_DIR with the API).
+    with metrics.capture_stages():
+        return [rescore_item(item, scoring, analytics) for item in items]
+
+
+def _validate(scoring: Optional[dict], analytics: str):
+    scoring_config(scoring)
+    if analytics not in ANALYTICS_LEVELS:
+        raise ValueError(f"analytics must be one of: {', '.join(ANALYTICS_LEVELS)}")
+
+
+def _chunks(items: list) -> list:
+    return [items[i:i + RESCORE_CHUNK_SIZE] for i in range(0, len(items), RESCORE_CHUNK_SIZE)]
+
+
+def submit_rescore(pool: Executor, items: list, scoring: Optional[dict] = None, analytics: str = "none") -> list:
+    """Submit items to `pool` in RESCORE_CHUNK_SIZE chunks; returns one future per chunk, in input order.
+
+    Lets async callers await the chunks without holding a thread. Raises ValueError for invalid
+    scoring overrides or analytics levels before anything is submitted.
+    """
+    _validate(scoring, analytics)
+    return [pool.submit(_rescore_chunk, chunk, scoring, analytics) for chunk in _chunks(items)]
+
+
+def rescore_many(items: list, scoring: Optional[dict] = None, analytics: str = "none",
+                 workers: Optional[int] = None, pool: Optional[Executor] = None) -> list:
+    """Rescore items in parallel worker processes; entries keep input order.
+
+    Uses `pool` when given, otherwise a pool of `workers` processes for the duration of the
+    call; workers=1 scores inline. Raises ValueError for invalid scoring overrides or analytics
+    levels before any work starts.
+    """
+    _validate(scoring, analytics)
+    if pool is None and (workers == 1 or len(_chunks(items)) <= 1):
+        return _rescore_chunk(items, scoring, analytics)
+
+    owned = pool is None
+    if owned:
+        pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 2,
+                                   mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = submit_rescore(pool, items, scoring, analytics)
+        return [entry for future in futures for entry in future.result()]
+    finally:
+        if owned:
+            pool.shutdown()
+
+
+def rescore_summary(entries: list) -> dict:
+    """How many items were rescored and how their 1-10 scores and levels moved."""
+    rescored = [e for e in entries if e["success"]]
+    compared = [e for e in rescored if (e.get("previous") or {}).get("score") is not None]
+    deltas = [e["result"]["score"] - e["previous"]["score"] for e in compared]
+    return {
+        "total": len(entries),
+        "rescored": len(rescored),
+        "failed": len(entries) - len(rescored),
+        "compared": len(compared),
+        "score_changed": sum(1 for d in deltas if d),
+        "mean_score_delta": round(sum(deltas) / len(deltas), 3) if deltas else 0.0,
+        "level_changed": sum(1 for e in compared if e["result"]["level_measured"] != e["previous"].get("level_measured")),
+    }
+
+
+def read_items(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rescore stored assessments from their raw recognition results.")
+    parser.add_argument("input", help="JSON list or JSON lines of {id?, reference_text, language?, raw_results | result}")
+    parser.add_argument("output", help="JSON lines file to write, one entry per input item")
+    parser.add_argument("--scoring", help="JSON file of scoring overrides (see nodes.scoring.DEFAULT_SCORING)")
+    parser.add_argument("--analytics", default="none", choices=ANALYTICS_LEVELS, help="Analytics level of the rescored results")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Worker processes")
+    args = parser.parse_args(argv)
+
+    scoring = None
+    if args.scoring:
+        with open(args.scoring, "r", encoding="utf-8") as f:
+            scoring = json.load(f)
+    started = time.perf_counter()
+    entries = rescore_many(read_items(args.input), scoring, args.analytics, workers=args.workers)
+    with open(args.output, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    summary = rescore_summary(entries)
+    summary["elapsed_sec"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
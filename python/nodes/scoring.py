@@ -0,0 +1,485 @@
+import math
+import string
+import difflib
+import statistics
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Optional
+from core import metrics
+
+# full: everything below; basic: counts, rates, distribution, silences and summary; none: top-level scores only
+ANALYTICS_LEVELS = ('full', 'basic', 'none')
+
+# Tunable scoring parameters; score_results() takes overrides for any of these keys.
+DEFAULT_SCORING = {
+    # Pronunciation mix; re-normalized over the components present (prosody may be unavailable).
+    'pronunciation_weights': {'accuracy': 0.4, 'prosody': 0.2, 'fluency': 0.2, 'completeness': 0.2},
+    # Delay index = weighted (1 - fluency), silence ratio and (1 - completeness); higher means more delay.
+    'delay_weights': {'fluency': 0.5, 'silence': 0.3, 'completeness': 0.2},
+    # Upper bounds of levels 0-2 on the delay index; anything above the last is level 3.
+    'delay_thresholds': [0.20, 0.35, 0.55],
+    # 1-10 score = 1 + 9 * weighted (inverse delay, accuracy, fluency).
+    'score_weights': {'inverse_delay': 0.5, 'accuracy': 0.25, 'fluency': 0.25},
+}
+
+
+def _is_number(value) -> bool:
+    # bool is an int subclass, but `true` as a weight is a client mistake rather than 1.
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def scoring_config(overrides: Optional[dict] = None) -> dict:
+    """DEFAULT_SCORING with `overrides` applied per key; raises ValueError on unknown keys or non-numeric values."""
+    if overrides is not None and not isinstance(overrides, dict):
+        raise ValueError("scoring must be an object of overrides")
+    config = {key: (dict(value) if isinstance(value, dict) else list(value)) for key, value in DEFAULT_SCORING.items()}
+    for key, value in (overrides or {}).items():
+        if key not in DEFAULT_SCORING:
+            raise ValueError(f"Unknown scoring key '{key}'. Expected one of: {', '.join(DEFAULT_SCORING)}")
+        if isinstance(DEFAULT_SCORING[key], dict):
+            if not isinstance(value, dict) or set(value) - set(DEFAULT_SCORING[key]):
+                raise ValueError(f"scoring.{key} accepts: {', '.join(DEFAULT_SCORING[key])}")
+            if not all(_is_number(v) for v in value.values()):
+                raise ValueError(f"scoring.{key} values must be numbers")
+            config[key].update(value)
+        else:
+            if (not isinstance(value, list) or len(value) != len(DEFAULT_SCORING[key])
+                    or not all(_is_number(v) for v in value)):
+                raise ValueError(f"scoring.{key} must be a list of {len(DEFAULT_SCORING[key])} numbers")
+            config[key] = list(value)
+    return config
+
+
+class _Word:
+    """Word-level assessment read from the service JSON; error_type is updated during alignment."""
+
+    __slots__ = ('word', 'accuracy_score', 'error_type')
+
+    def __init__(self, word: str, accuracy_score=0, error_type: str = 'None'):
+        self.word = word
+        self.accuracy_score = accuracy_score
+        self.error_type = error_type
+
+    @classmethod
+    def from_json(cls, w: dict) -> '_Word':
+        pa = w.get('PronunciationAssessment') or {}
+        return cls(w.get('Word'), pa.get('AccuracyScore', 0), pa.get('ErrorType', 'None'))
+
+
+def session_from_raw(raw_results: list) -> dict:
+    """Rebuild the per-segment session data scoring needs from the service's raw JSON results."""
+    recognized_words = []
+    fluency_scores = []
+    prosody_scores = []
+    durations = []  # per recognized segment total word duration (ticks)
+    recognized_segments = []  # NBest[0] per segment for deep analysis
+    segment_summaries = []  # summary per segment: text, confidence, scores, times
+    transcripts_display = []
+    transcripts_lexical = []
+    recognized_json_words = []  # flattened words for timeline
+
+    for jo in raw_results:
+        dur = 0
+        nbest_list = jo.get('NBest', []) if isinstance(jo, dict) else []
+        nb = nbest_list[0] if nbest_list else {}
+        pa = nb.get('PronunciationAssessment') or {}
+        try:
+            words = nb.get('Words', [])
+            recognized_words += [_Word.from_json(w) for w in words]
+            # Persist segment and words for post-analysis
+            recognized_segments.append(nb)
+            recognized_json_words.extend(words)
+            dur = sum(int(w.get('Duration', 0)) for w in words if isinstance(w.get('Duration', 0), (int, str)))
+
+            # Segment summary
+            seg_text_display = nb.get('Display') or nb.get('Lexical') or nb.get('Text')
+            seg_text_lexical = nb.get('Lexical') or nb.get('Text') or seg_text_display
+            transcripts_display.append(seg_text_display or '')
+            transcripts_lexical.append(seg_text_lexical or '')
+            # Approx segment times
+            seg_offset = min((int(w.get('Offset', 0)) for w in words), default=0)
+            seg_end = max(((int(w.get('Offset', 0)) + int(w.get('Duration', 0))) for w in words), default=0)
+            segment_summaries.append({
+                'display': seg_text_display,
+                'lexical': seg_text_lexical,
+                'confidence': nb.get('Confidence'),
+                'fluency_score': pa.get('FluencyScore'),
+                'prosody_score': pa.get('ProsodyScore'),
+                'offset_sec': seg_offset / 10_000_000 if seg_offset else 0.0,
+                'end_sec': seg_end / 10_000_000 if seg_end else 0.0,
+                'duration_sec': ((seg_end - seg_offset) / 10_000_000) if (seg_end and seg_offset and seg_end >= seg_offset) else (dur / 10_000_000),
+                'alternatives': [
+                    {
+                        'display': alt.get('Display') or alt.get('Lexical') or alt.get('Text'),
+                        'lexical': alt.get('Lexical') or alt.get('Text'),
+                        'confidence': alt.get('Confidence'),
+                    }
+                    for alt in nbest_list[:5]
+                ] if nbest_list else []
+            })
+        except Exception:
+            dur = 0
+        durations.append(dur)
+
+        # Guard None values for scores; ensure list lengths match durations
+        fluency_scores.append(pa.get('FluencyScore') if pa.get('FluencyScore') is not None else 0.0)
+        if pa.get('ProsodyScore') is not None:
+            prosody_scores.append(pa['ProsodyScore'])
+
+    return {
+        'recognized_words': recognized_words,
+        'fluency_scores': fluency_scores,
+        'prosody_scores': prosody_scores,
+        'durations': durations,
+        'recognized_segments': recognized_segments,
+        'recognized_results_raw': raw_results,
+        'segment_summaries': segment_summaries,
+        'transcripts_display': transcripts_display,
+        'transcripts_lexical': transcripts_lexical,
+        'recognized_json_words': recognized_json_words,
+    }
+
+
+@lru_cache(maxsize=256)
+def tokenize_reference(reference_text: str) -> tuple:
+    """Whitespace tokenization of the reference for non-Chinese locales (zh-CN segmentation depends on the session)."""
+    return tuple(w.strip(string.punctuation) for w in reference_text.lower().split())
+
+
+def score_results(raw_results: list, reference_text: str, language: str = 'en-US',
+                  enable_miscue: bool = True, analytics: str = 'full', scoring: Optional[dict] = None) -> dict:
+    """Align raw recognition results with the reference text and build scores/analytics.
+
+    Pure and CPU bound: `raw_results` is the service JSON per segment (what `analytics.raw.results`
+    stores), so stored assessments can be rescored offline with different `scoring` parameters.
+    """
+    config = scoring_config(scoring)
+    session = session_from_raw(raw_results)
+    recognized_words = session['recognized_words']
+    fluency_scores = session['fluency_scores']
+    prosody_scores = session['prosody_scores']
+    durations = session['durations']
+    recognized_segments = session['recognized_segments']
+    recognized_results_raw = session['recognized_results_raw']
+    segment_summaries = session['segment_summaries']
+    transcripts_display = session['transcripts_display']
+    transcripts_lexical = session['transcripts_lexical']
+    recognized_json_words = session['recognized_json_words']
+
+    with metrics.stage("level_measurement", "alignment"):
+        if language == 'zh-CN':
+            import jieba
+            import zhon.hanzi
+            jieba.suggest_freq([x.word for x in recognized_words], True)
+            reference_words = [w for w in jieba.cut(reference_text) if w not in zhon.hanzi.punctuation]
+        else:
+            reference_words = list(tokenize_reference(reference_text))
+
+        if enable_miscue:
+            diff = difflib.SequenceMatcher(None, reference_words, [x.word.lower() for x in recognized_words])
+            final_words = []
+            for tag, i1, i2, j1, j2 in diff.get_opcodes():
+                if tag in ['insert', 'replace']:
+                    for word in recognized_words[j1:j2]:
+                        if word.error_type == 'None':
+                            word.error_type = 'Insertion'
+                        final_words.append(word)
+                if tag in ['delete', 'replace']:
+                    for word_text in reference_words[i1:i2]:
+                        final_words.append(_Word(word_text, 0, 'Omission'))
+                if tag == 'equal':
+                    final_words += recognized_words[j1:j2]
+        else:
+            final_words = recognized_words
+
+    analytics_started = time.perf_counter()
+    final_accuracy_scores = [word.accuracy_score for word in final_words if word.error_type != 'Insertion']
+    accuracy_score = sum(final_accuracy_scores) / len(final_accuracy_scores) if final_accuracy_scores else 0
+    fluency_score = sum(x * y for (x, y) in zip(fluency_scores, durations)) / sum(durations) if durations and sum(durations) > 0 else 0
+    completeness_score = len([w for w in recognized_words if w.error_type == "None"]) / len(reference_words) * 100 if reference_words else 0
+    completeness_score = completeness_score if completeness_score <= 100 else 100
+    numeric_prosody = [ps for ps in prosody_scores if isinstance(ps, (int, float))]
+    prosody_score = sum(numeric_prosody) / len(numeric_prosody) if numeric_prosody else 0
+
+    # Re-normalize weights if prosody is unavailable (keeps response fields but avoids unfairly penalizing)
+    weights = config['pronunciation_weights']
+    components = {
+        "accuracy": accuracy_score,
+        "prosody": prosody_score if numeric_prosody else None,
+        "fluency": fluency_score,
+        "completeness": completeness_score,
+    }
+    active = {k: v for k, v in components.items() if v is not None}
+    total_w = sum(weights[k] for k in active.keys())
+    pron_score = sum(active[k] * (weights[k] / total_w) for k in active.keys()) if total_w > 0 else 0
+
+    word_results = [
+        {
+            'word': word.word,
+            'accuracy_score': word.accuracy_score,
+            'error_type': word.error_type
+        }
+        for word in final_words
+    ]
+
+    # Compute additional analytics
+    insertion_count = len([w for w in final_words if w.error_type == 'Insertion'])
+    omission_count = len([w for w in final_words if w.error_type == 'Omission'])
+    mispronunciation_count = len([w for w in final_words if w.error_type == 'Mispronunciation'])
+    correct_count = len([w for w in final_words if w.error_type == 'None'])
+    total_ref = len(reference_words)
+    wer = ((mispronunciation_count + omission_count + insertion_count) / total_ref) * 100 if total_ref else 0
+
+    # Build per-word timeline using offsets/durations from JSON when available
+    TICKS_PER_SECOND = 10_000_000
+    def to_sec(ticks):
+        try:
+            return int(ticks) / TICKS_PER_SECOND
+        except Exception:
+            return 0.0
+
+    timeline = []
+    for w in recognized_json_words:
+        pa = (w.get('PronunciationAssessment') or {}) if isinstance(w, dict) else {}
+        item = {
+            'word': w.get('Word'),
+            'offset_sec': to_sec(w.get('Offset', 0)),
+            'duration_sec': to_sec(w.get('Duration', 0)),
+            'end_sec': to_sec(int(w.get('Offset', 0)) + int(w.get('Duration', 0)) if str(w.get('Offset', '0')).isdigit() and str(w.get('Duration', '0')).isdigit() else 0),
+            'accuracy_score': pa.get('AccuracyScore'),
+            'error_type': pa.get('ErrorType'),
+        }
+        if analytics == 'full':
+            # Include syllables/phonemes raw details when present (shape varies by locale)
+            item['syllables'] = w.get('Syllables')
+        timeline.append(item)
+
+    if timeline:
+        span_start = min(item['offset_sec'] for item in timeline)
+        span_end = max(item['end_sec'] for item in timeline)
+        span_duration_sec = max(span_end - span_start, 0.0)
+    else:
+        span_duration_sec = 0.0
+
+    speech_time_sec = sum(to_sec(d) for d in durations)
+    words_count = len([w for w in recognized_json_words if isinstance(w, dict)])
+    wpm_span = (words_count / span_duration_sec * 60.0) if span_duration_sec > 0 else 0.0
+    wpm_articulation = (words_count / speech_time_sec * 60.0) if speech_time_sec > 0 else 0.0
+
+    # Detect silence segments between timeline words
+    silences = []
+    if len(timeline) >= 2:
+        timeline_sorted = sorted(timeline, key=lambda x: x['offset_sec'])
+        for prev, nxt in zip(timeline_sorted, timeline_sorted[1:]):
+            gap = max(nxt['offset_sec'] - prev['end_sec'], 0.0)
+            if gap > 0:
+                silences.append({
+                    'start_sec': prev['end_sec'],
+                    'end_sec': nxt['offset_sec'],
+                    'duration_sec': gap,
+                })
+
+    # Aggregate per unique word (case-insensitive)
+    per_word = {}
+    if analytics == 'full':
+        for item in timeline:
+            key = (item['word'] or '').lower()
+            if not key:
+                continue
+            agg = per_word.setdefault(key, {
+                'occurrences': 0,
+                'avg_accuracy': None,
+                'min_accuracy': None,
+                'max_accuracy': None,
+                'total_duration_sec': 0.0,
+            })
+            acc = item.get('accuracy_score')
+            agg['occurrences'] += 1
+            agg['total_duration_sec'] += item.get('duration_sec') or 0.0
+            if isinstance(acc, (int, float)):
+                if agg['avg_accuracy'] is None:
+                    agg['avg_accuracy'] = acc
+                    agg['min_accuracy'] = acc
+                    agg['max_accuracy'] = acc
+                else:
+                    # running average
+                    agg['avg_accuracy'] = (agg['avg_accuracy'] * (agg['occurrences'] - 1) + acc) / agg['occurrences']
+                    agg['min_accuracy'] = min(agg['min_accuracy'], acc)
+                    agg['max_accuracy'] = max(agg['max_accuracy'], acc)
+
+    # Accuracy distribution buckets
+    def bucket(score):
+        try:
+            s = float(score)
+        except Exception:
+            return 'unknown'
+        if s < 60:
+            return '<60'
+        if s < 80:
+            return '60-79'
+        if s < 90:
+            return '80-89'
+        if s < 100:
+            return '90-99'
+        return '100'
+
+    acc_buckets = {}
+    if analytics != 'none':
+        for w in timeline:
+            b = bucket(w.get('accuracy_score'))
+            acc_buckets[b] = acc_buckets.get(b, 0) + 1
+
+    # Compute an overall delay score using fluency, completeness, and silence
+    total_silence_sec = sum(s.get('duration_sec', 0.0) for s in silences) if 'silences' in locals() else 0.0
+    silence_ratio = (total_silence_sec / span_duration_sec) if span_duration_sec > 0 else 0.0
+    fluency_norm = max(0.0, min(1.0, fluency_score / 100.0))
+    completeness_norm = max(0.0, min(1.0, completeness_score / 100.0))
+    # Composite delay index: higher means more delay
+    delay_weights = config['delay_weights']
+    delay_index = (delay_weights['fluency'] * (1.0 - fluency_norm) + delay_weights['silence'] * silence_ratio
+                   + delay_weights['completeness'] * (1.0 - completeness_norm))
+
+    levels_map = {
+        0: 'natural',
+        1: 'slight delay',
+        2: 'Medium delay',
+        3: 'severe delay',
+    }
+    level_code = next((i for i, bound in enumerate(config['delay_thresholds']) if delay_index < bound), 3)
+
+    # Final 1-10 score (higher is better). Combine inverse delay with accuracy and fluency.
+    # Clamp in [1,10] and round to nearest int.
+    inv_delay = max(0.0, min(1.0, 1.0 - delay_index))
+    acc_norm = max(0.0, min(1.0, accuracy_score / 100.0))
+    flu_norm = max(0.0, min(1.0, fluency_score / 100.0))
+    score_weights = config['score_weights']
+    quality = score_weights['inverse_delay'] * inv_delay + score_weights['accuracy'] * acc_norm + score_weights['fluency'] * flu_norm
+    score = int(round(1 + (max(0.0, min(1.0, quality)) * 9)))
+
+    result = {
+        'level_measured': level_code,
+        'levels': levels_map,
+        'score': score,
+        # Backward-compatible top-level scores
+        'paragraph_pronunciation_score': pron_score,
+        'accuracy_score': accuracy_score,
+        'completeness_score': completeness_score,
+        'fluency_score': fluency_score,
+        'prosody_score': prosody_score,
+        'words': word_results,
+    }
+    if analytics == 'none':
+        metrics.observe_stage("level_measurement", "analytics", time.perf_counter() - analytics_started)
+        return result
+
+    # New detailed analytics
+    result['analytics'] = {
+        'word_error_rate_percent': wer,
+        'counts': {
+            'reference_word_count': total_ref,
+            'recognized_word_count': len(recognized_words),
+            'correct': correct_count,
+            'insertions': insertion_count,
+            'omissions': omission_count,
+            'mispronunciations': mispronunciation_count,
+        },
+        'speaking_rates': {
+            'wpm_overall_span': wpm_span,
+            'wpm_articulation_time': wpm_articulation,
+            'total_span_duration_sec': span_duration_sec,
+            'total_articulation_time_sec': speech_time_sec,
+        },
+        'accuracy_distribution': acc_buckets,
+        'silences': silences,
+        'summary': {
+            'timeline_word_count': words_count,
+            'timeline_span_sec': span_duration_sec,
+            'avg_word_duration_sec': (speech_time_sec / words_count) if words_count else 0.0,
+            'median_word_duration_sec': (statistics.median([w.get('duration_sec') or 0.0 for w in timeline]) if timeline else 0.0),
+        }
+    }
+    if analytics == 'full':
+        result['analytics'].update({
+            'timeline': timeline,
+            'per_word': per_word,
+            'transcripts': {
+                'display': transcripts_display,
+                'lexical': transcripts_lexical,
+            },
+            'segments': recognized_segments,
+            'segment_summaries': segment_summaries,
+            'raw': {
+                'results': recognized_results_raw,
+            },
+        })
+
+    metrics.observe_stage("level_measurement", "analytics", time.perf_counter() - analytics_started)
+    return result
+
+
+def score_results_captured(*args, **kwargs) -> tuple:
+    """score_results for a worker process: returns (result, captured stage timings) for the parent to record."""
+    with metrics.capture_stages() as stages:
+        result = score_results(*args, **kwargs)
+    return result, stages
+
+
+def cohort_summary(results: list, top_words: int = 10) -> dict:
+    """Aggregate many assessments of the same passage in one pass.
+
+    Returns the 1-10 score and level distributions, summary statistics of the top-level scores,
+    and the words most often omitted or mispronounced across the cohort.
+    """
+    score_counts = Counter()
+    level_counts = Counter()
+    score_values = {'paragraph_pronunciation_score': [], 'accuracy_score': [], 'fluency_score': [],
+                    'completeness_score': [], 'prosody_score': []}
+    missed = Counter()
+    occurrences = Counter()
+    word_accuracy = {}
+    for result in results:
+        score_counts[result.get('score')] += 1
+        level_counts[result.get('level_measured')] += 1
+        for key, values in score_values.items():
+            if isinstance(result.get(key), (int, float)):
+                values.append(result[key])
+        for w in result.get('words') or []:
+            word = (w.get('word') or '').lower()
+            if not word:
+                continue
+            if w.get('error_type') == 'Insertion':
+                continue
+            occurrences[word] += 1
+            if w.get('error_type') in ('Omission', 'Mispronunciation'):
+                missed[word] += 1
+            if isinstance(w.get('accuracy_score'), (int, float)):
+                total, count = word_accuracy.get(word, (0.0, 0))
+                word_accuracy[word] = (total + w['accuracy_score'], count + 1)
+
+    def describe(values):
+        if not values:
+            return None
+        return {
+            'mean': statistics.fmean(values),
+            'median': statistics.median(values),
+            'min': min(values),
+            'max': max(values),
+            'stdev': statistics.pstdev(values),
+        }
+
+    return {
+        'assessed': len(results),
+        'score_distribution': {str(k): v for k, v in sorted(score_counts.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))},
+        'level_distribution': {str(k): v for k, v in sorted(level_counts.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))},
+        'scores': {key: describe(values) for key, values in score_values.items()},
+        'most_missed_words': [
+            {
+                'word': word,
+                'missed': count,
+                'missed_rate': count / occurrences[word],
+                'avg_accuracy': (word_accuracy[word][0] / word_accuracy[word][1]) if word in word_accuracy else None,
+            }
+            for word, count in missed.most_common(top_words)
+        ],
+    }
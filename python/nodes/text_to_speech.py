@@ -1,10 +1,44 @@
 import os
+import re
 import html
-from dotenv import load_dotenv
+import json
+import time
+import struct
+import tempfile
+from typing import Optional
 import azure.cognitiveservices.speech as speechsdk
+from core import admission, executors, metrics, result_cache, speech_endpoints, wav
+from core.admission import Overloaded
+from core.speech_endpoints import NoSpeechEndpoints, SpeechBackendError
+from nodes import voice_catalog
 
+# Require at least ~1KB of audio data to avoid near-empty files
+MIN_DATA_BYTES = 1024
 
-def text_to_speech(text: str, voice_name: str, output_path: str, language: str):
+# Long-text mode: texts of at least TTS_LONG_TEXT_CHARS are split into one chunk per sentence (sentences
+# shorter than TTS_CHUNK_MIN_CHARS join the next one, longer than TTS_CHUNK_MAX_CHARS are split), synthesized
+# concurrently on the `tts_chunks` executor and joined with TTS_CHUNK_GAP_MS of silence.
+TTS_LONG_TEXT_CHARS = int(os.getenv("TTS_LONG_TEXT_CHARS", "400"))
+TTS_CHUNK_MIN_CHARS = int(os.getenv("TTS_CHUNK_MIN_CHARS", "40"))
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "300"))
+TTS_CHUNK_GAP_MS = int(os.getenv("TTS_CHUNK_GAP_MS", "150"))
+# Word clips: silence kept around each word, limited to half the pause to its neighbours so clips never overlap.
+TTS_WORD_PAD_MS = int(os.getenv("TTS_WORD_PAD_MS", "80"))
+
+# Latin terminators only end a sentence before whitespace (keeps "3.5" intact); CJK/Arabic ones always do.
+_SENTENCE = re.compile(r".+?(?:[.!?;…]+(?=\s|$)|[؟。！？]+|\n+|$)\s*", re.S)
+# A "sentence" ending in one of these abbreviations is rejoined with the next ("e.g. the", "Dr. Smith").
+_ABBREVIATION = re.compile(r"(?:^|[\s(])(?:e\.g|i\.e|cf|vs|approx|mr|mrs|ms|dr|prof|st|no)\.\s*$", re.I)
+_CLAUSE = re.compile(r"[^,،、，:]+(?:[,،、，:]+|$)\s*")
+_WORD = re.compile(r"\S+\s*")
+
+
+class _ChunkFailed(Exception):
+    """A chunk synthesized without a backend error but produced no usable audio."""
+
+
+def text_to_speech(text: str, voice_name: str, output_path: str, language: str, return_audio: bool = False,
+                   long_text: Optional[bool] = None):
     """
     Generate speech audio from text using Azure Speech with a specified voice.
 
@@ -12,240 +46,476 @@ def text_to_speech(text: str, voice_name: str, output_path: str, language: str):
         text: Text to synthesize.
         voice_name: Azure voice name (e.g., "en-US-JennyNeural", "ar-EG-SalmaNeural").
         output_path: WAV file path to write the synthesized audio.
+        return_audio: Also return the WAV bytes as `audio` (saves reading the file back).
+        long_text: Force (True) or disable (False) sentence-chunked synthesis; None decides by length.
+
+    Returns:
+        dict with success, message, and output_file (plus audio when requested).
+        Raises SpeechBackendError when no endpoint is configured or every endpoint failed.
+    """
+    result = synthesize_to_bytes(text=text, voice_name=voice_name, language=language, long_text=long_text)
+    audio = result.pop("audio", None)
+    if not result.get("success"):
+        result["output_file"] = None
+        return result
+    try:
+        write_audio(output_path, audio)
+    except Exception as e:
+        metrics.record_error("text_to_speech", e)
+        return {
+            "success": False,
+            "message": f"Error during TTS: {str(e)}",
+            "output_file": None,
+        }
+    result["output_file"] = output_path
+    if return_audio:
+        result["audio"] = audio
+    return result
+
+
+def synthesize_to_bytes(text: str, voice_name: str, language: str, long_text: Optional[bool] = None):
+    """
+    Synthesize speech fully in memory (no files touched).
+
+    Long texts (see TTS_LONG_TEXT_CHARS, or long_text=True) are synthesized sentence by sentence in
+    parallel and concatenated. Audio is cached per text (or sentence) in the shared cache, so repeated texts
+    skip synthesis in every worker and edited passages only re-synthesize what changed.
 
     Returns:
-        dict with success, message, and output_file.
+        dict with success, message, and audio (complete RIFF/WAV bytes, or None on failure).
+        Raises SpeechBackendError when no endpoint is configured or every endpoint failed.
     """
     try:
-        load_dotenv()
-        key = os.getenv("AZURE_SPEECH_KEY_TTS")
-        region = os.getenv("AZURE_SPEECH_REGION_TTS")
-        if not key or not region:
+        endpoints = speech_endpoints.pool("TTS", default_hedge_after_sec=3.0)
+        if not endpoints.endpoints:
+            raise NoSpeechEndpoints("Missing AZURE_SPEECH_KEY_TTS or AZURE_SPEECH_REGION_TTS (or AZURE_SPEECH_ENDPOINTS_TTS) in environment.")
+        # Reject unknown voices up front instead of after a full synthesis round trip.
+        voice_error = voice_catalog.get_catalog().validate(voice_name)
+        if voice_error:
+            metrics.record_error("text_to_speech", "unknown_voice")
             return {
                 "success": False,
-                "message": "Missing AZURE_SPEECH_KEY_TTS or AZURE_SPEECH_REGION_TTS in environment.",
-                "output_file": None,
+                "message": voice_error,
+                "audio": None,
             }
-
-        speech_config = speechsdk.SpeechConfig(subscription=key, region=region)
-        # Use a stable PCM format to reduce edge cases with tiny outputs
-        try:
-            speech_config.set_speech_synthesis_output_format(
-                speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm
-            )
-        except Exception:
-            # Some SDK versions allow property assignment instead
-            try:
-                speech_config.speech_synthesis_output_format = (
-                    speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm
-                )
-            except Exception:
-                pass
-        # Prefer explicit voice over language to avoid SDK routing oddities
-        if voice_name:
-            speech_config.speech_synthesis_voice_name = voice_name
-        elif language:
-            speech_config.speech_synthesis_language = language
-
-        # Ensure output directory exists
-        out_dir = os.path.dirname(output_path)
-        if out_dir and not os.path.exists(out_dir):
-            os.makedirs(out_dir, exist_ok=True)
-
-        # Use a WAV file output stream to force writing to the specified path
-        wav_stream = None
+        if long_text is None:
+            long_text = len((text or "").strip()) >= TTS_LONG_TEXT_CHARS
+        chunks = split_sentences(text, TTS_CHUNK_MAX_CHARS, TTS_CHUNK_MIN_CHARS) if long_text else []
+        if len(chunks) > 1:
+            return _synthesize_chunks(endpoints, chunks, voice_name, language)
         try:
-            wav_stream = speechsdk.audio.AudioOutputStream.create_wav_file_output(output_path)
-            audio_config = speechsdk.audio.AudioOutputConfig(stream=wav_stream)
-        except Exception:
-            # Fallback to filename mode if stream-based is unavailable
-            audio_config = speechsdk.audio.AudioOutputConfig(filename=output_path)
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-
-        # For very short inputs (single word or extremely short text), use SSML with an explicit <voice>
-        # and a short trailing break to encourage the SDK to emit a proper WAV consistently.
-        normalized = (text or "").strip()
-        word_count = len(normalized.split())
-        use_ssml = (word_count <= 1) or (len(normalized) < 4)
-        if use_ssml:
-            # Resolve SSML locale and voice.
-            def _default_voice_for_lang(lang_code: str) -> str:
-                if not lang_code:
-                    return "en-US-JennyNeural"
-                lc = lang_code.lower()
-                if lc.startswith("ar"): return "ar-EG-SalmaNeural"
-                if lc.startswith("en"): return "en-US-JennyNeural"
-                if lc.startswith("zh"): return "zh-CN-XiaoxiaoNeural"
-                if lc.startswith("fr"): return "fr-FR-DeniseNeural"
-                if lc.startswith("es"): return "es-ES-ElviraNeural"
-                if lc.startswith("de"): return "de-DE-KatjaNeural"
-                if lc.startswith("it"): return "it-IT-ElsaNeural"
-                if lc.startswith("ja"): return "ja-JP-NanamiNeural"
-                if lc.startswith("ko"): return "ko-KR-SunHiNeural"
-                if lc.startswith("pt"): return "pt-BR-FranciscaNeural"
-                if lc.startswith("ru"): return "ru-RU-DariyaNeural"
-                if lc.startswith("tr"): return "tr-TR-EmelNeural"
-                return "en-US-JennyNeural"
-
-            # Prefer provided voice; else choose a default for the language; else generic English.
-            ssml_voice = voice_name or _default_voice_for_lang(language)
-            # Choose SSML language: prefer derived from voice, else provided language, else default.
-            ssml_lang = None
-            if ssml_voice and "-" in ssml_voice:
-                parts = ssml_voice.split("-")
-                if len(parts) >= 2:
-                    ssml_lang = f"{parts[0]}-{parts[1]}"
-            if not ssml_lang:
-                ssml_lang = language or "en-US"
-
-            esc_text = html.escape(normalized, quote=True)
-            ssml = (
-                f"<speak version='1.0' xml:lang='{ssml_lang}'>"
-                f"<voice name='{ssml_voice}'>"
-                f"<p><s><break time='200ms'/>"  # pre-pause
-                f"{esc_text}."
-                f"<break time='600ms'/></s></p>"  # post-pause
-                f"</voice>"
-                f"</speak>"
-            )
-            result = synthesizer.speak_ssml_async(ssml).get()
+            audio = _synthesize_cached(endpoints, text, voice_name, language)
+        except _ChunkFailed as e:
+            return {
+                "success": False,
+                "message": str(e),
+                "audio": None,
+            }
+        return {
+            "success": True,
+            "message": "Speech synthesized successfully.",
+            "audio": audio,
+        }
+    except (Overloaded, SpeechBackendError):
+        # Admission pushed back (429 + Retry-After), or every endpoint failed (502/503); the API maps both.
+        raise
+    except Exception as e:
+        metrics.record_error("text_to_speech", e)
+        return {
+            "success": False,
+            "message": f"Error during TTS: {str(e)}",
+            "audio": None,
+        }
+
+
+def split_sentences(text: str, max_chars: int, min_chars: int = 0) -> list:
+    """Split text into sentence chunks of at most `max_chars`.
+
+    Sentences longer than `max_chars` are split at clause punctuation, then at word boundaries.
+    Sentences shorter than `min_chars` are merged into the following one. A chunk ends after every
+    sentence of at least `min_chars`, whatever came before it, so editing one sentence only changes
+    its own chunk (and the run of short sentences merged into it); other chunks keep their cache keys.
+    """
+    sentences = []
+    for sentence in _SENTENCE.findall(text or ""):
+        if sentences and _ABBREVIATION.search(sentences[-1]):
+            sentences[-1] += sentence
         else:
-            result = synthesizer.speak_text_async(text).get()
+            sentences.append(sentence)
 
-        # Ensure stream is closed to flush bytes to disk (esp. on Windows)
-        try:
-            if wav_stream and hasattr(wav_stream, "close"):
-                wav_stream.close()
-        except Exception:
-            pass
+    pieces = []
+    for sentence in sentences:
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _CLAUSE.findall(sentence):
+            if len(clause) <= max_chars:
+                pieces.append(clause)
+            else:
+                words = _WORD.findall(clause) or [clause]
+                pieces.extend(w[i:i + max_chars] for w in words for i in range(0, len(w), max_chars))
 
-        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-            # Helper to check valid WAV size (44 bytes header minimal)
-            def _filesize(p: str) -> int:
-                try:
-                    return os.path.getsize(p)
-                except Exception:
-                    return 0
-            # Helper to read 'data' chunk size in WAV
-            def _wav_data_size(p: str) -> int:
-                try:
-                    with open(p, 'rb') as f:
-                        b = f.read()
-                    idx = b.find(b'data')
-                    if idx == -1 or idx + 8 > len(b):
-                        return 0
-                    # next 4 bytes little-endian is chunk size
-                    import struct
-                    return struct.unpack('<I', b[idx+4:idx+8])[0]
-                except Exception:
-                    return 0
-
-            size = _filesize(output_path)
-            data_bytes = _wav_data_size(output_path) if size >= 44 else 0
-            if size < 44:
-                # Try fallback: write in-memory audio data if available
-                audio_bytes = getattr(result, 'audio_data', None)
-                if audio_bytes and len(audio_bytes) >= 44:
-                    with open(output_path, 'wb') as f:
-                        f.write(audio_bytes)
-            size = _filesize(output_path)
-            data_bytes = _wav_data_size(output_path)
-
-            # If still too small and we used SSML, attempt one retry with longer trailing break
-            MIN_DATA_BYTES = 1024  # require at least ~1KB of audio data to avoid near-empty files
-            if (size < 44 or data_bytes < MIN_DATA_BYTES) and use_ssml:
-                try:
-                    esc_text = html.escape(normalized, quote=True)
-                    # Reuse the resolved ssml_voice/ssml_lang if available; recompute if not in scope
-                    def _default_voice_for_lang(lang_code: str) -> str:
-                        if not lang_code:
-                            return "en-US-JennyNeural"
-                        lc = lang_code.lower()
-                        if lc.startswith("ar"): return "ar-EG-SalmaNeural"
-                        if lc.startswith("en"): return "en-US-JennyNeural"
-                        if lc.startswith("zh"): return "zh-CN-XiaoxiaoNeural"
-                        if lc.startswith("fr"): return "fr-FR-DeniseNeural"
-                        if lc.startswith("es"): return "es-ES-ElviraNeural"
-                        if lc.startswith("de"): return "de-DE-KatjaNeural"
-                        if lc.startswith("it"): return "it-IT-ElsaNeural"
-                        if lc.startswith("ja"): return "ja-JP-NanamiNeural"
-                        if lc.startswith("ko"): return "ko-KR-SunHiNeural"
-                        if lc.startswith("pt"): return "pt-BR-FranciscaNeural"
-                        if lc.startswith("ru"): return "ru-RU-DariyaNeural"
-                        if lc.startswith("tr"): return "tr-TR-EmelNeural"
-                        return "en-US-JennyNeural"
-
-                    retry_voice = voice_name or _default_voice_for_lang(language)
-                    retry_lang = None
-                    if retry_voice and "-" in retry_voice:
-                        parts = retry_voice.split("-")
-                        if len(parts) >= 2:
-                            retry_lang = f"{parts[0]}-{parts[1]}"
-                    if not retry_lang:
-                        retry_lang = language or "en-US"
-
-                    ssml_retry = (
-                        f"<speak version='1.0' xml:lang='{retry_lang}'>"
-                        f"<voice name='{retry_voice}'>"
-                        f"<p><s><break time='300ms'/>"
-                        f"{esc_text}."
-                        f"<break time='900ms'/></s></p>"
-                        f"</voice>"
-                        f"</speak>"
-                    )
-                    # Recreate a filename-based audio config to avoid stream reuse issues
-                    retry_audio_cfg = speechsdk.audio.AudioOutputConfig(filename=output_path)
-                    retry_synth = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=retry_audio_cfg)
-                    retry_result = retry_synth.speak_ssml_async(ssml_retry).get()
-                    if retry_result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                        size = _filesize(output_path)
-                        data_bytes = _wav_data_size(output_path) if size >= 44 else 0
-                        if size < 44 or data_bytes < MIN_DATA_BYTES:
-                            # Final fallback: write in-memory audio if any
-                            rb = getattr(retry_result, 'audio_data', None)
-                            if rb and len(rb) >= 44:
-                                with open(output_path, 'wb') as f:
-                                    f.write(rb)
-                                size = _filesize(output_path)
-                                data_bytes = _wav_data_size(output_path)
-                except Exception:
-                    pass
-
-            if size >= 44 and data_bytes >= MIN_DATA_BYTES:
-                return {
-                    "success": True,
-                    "message": "Speech synthesized successfully.",
-                    "output_file": output_path,
-                }
-
-            # Clean up empty file to avoid leaving a 0-byte artifact
-            try:
-                if os.path.exists(output_path) and _filesize(output_path) == 0:
-                    os.remove(output_path)
-            except Exception:
-                pass
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+        if len(piece.strip()) >= min_chars:
+            chunks.append(current)
+            current = ""
+    chunks.append(current)
+    return [c.strip() for c in chunks if c.strip()]
+
+
+def _synthesize_cached(endpoints, text: str, voice_name: str, language: str) -> bytes:
+    """WAV bytes for one text, from the shared audio cache or one synthesis; raises _ChunkFailed on failure.
+
+    Only a cache miss takes a `tts` admission slot, for the duration of its synthesis.
+    """
+    def compute():
+        # Attempts only produce bytes, so failover/hedge losers have nothing to clean up.
+        with admission.acquire("tts"):
+            result = endpoints.call(lambda endpoint: _synthesize(endpoint.speech_config(), text, voice_name, language))
+        if not result.get("success"):
+            raise _ChunkFailed(result.get("message"))
+        return result["audio"]
+
+    if result_cache.TTS_AUDIO_CACHE_ENABLED:
+        key = result_cache.content_key(text=text, voice=voice_name, language=language, format="riff-16khz-16bit-mono-pcm")
+        return result_cache.tts_audio_cache.get_or_compute(key, compute)
+    return compute()
+
+
+def _synthesize_chunks(endpoints, chunks: list, voice_name: str, language: str):
+    futures = []
+    try:
+        with metrics.stage("text_to_speech", "chunked_synthesis"):
+            # Not the request's own `synthesis` executor, so a request never waits on its own pool.
+            for c in chunks:
+                futures.append(executors.submit("tts_chunks", _synthesize_cached, endpoints, c, voice_name, language))
+            audios = [f.result() for f in futures]
+    except Exception as e:
+        # One failed chunk fails the text: drop the chunks not started yet so they never take
+        # tts_chunks threads or tts admission slots.
+        for f in futures:
+            f.cancel()
+        if not isinstance(e, _ChunkFailed):
+            raise
+        return {
+            "success": False,
+            "message": str(e),
+            "audio": None,
+        }
+    with metrics.stage("text_to_speech", "concat"):
+        audio = wav.concat_wavs(audios, gap_ms=TTS_CHUNK_GAP_MS)
+    return {
+        "success": True,
+        "message": f"Speech synthesized successfully ({len(chunks)} chunks).",
+        "audio": audio,
+    }
 
+
+def synthesize_words(text: str, voice_name: str, language: str):
+    """
+    Synthesize a sentence once and cut it into one clip per word, using the service's word boundaries.
+
+    Clips keep the sentence's prosody and avoid one fragile short-input synthesis per word.
+    The sentence audio and its boundaries are cached like any other synthesis.
+
+    Returns:
+        dict with success, message, audio (the sentence WAV) and words
+        ({word, text_offset, offset_sec, duration_sec, audio}), or audio None on failure.
+        Raises SpeechBackendError when no endpoint is configured or every endpoint failed.
+    """
+    try:
+        endpoints = speech_endpoints.pool("TTS", default_hedge_after_sec=3.0)
+        if not endpoints.endpoints:
+            raise NoSpeechEndpoints("Missing AZURE_SPEECH_KEY_TTS or AZURE_SPEECH_REGION_TTS (or AZURE_SPEECH_ENDPOINTS_TTS) in environment.")
+        voice_error = voice_catalog.get_catalog().validate(voice_name)
+        if voice_error:
+            metrics.record_error("text_to_speech", "unknown_voice")
             return {
                 "success": False,
-                "message": "Synthesis completed but produced empty/invalid audio for very short input. Try a longer text or different voice.",
-                "output_file": None,
+                "message": voice_error,
+                "audio": None,
             }
-        elif result.reason == speechsdk.ResultReason.Canceled:
-            details = result.cancellation_details
+
+        def compute():
+            with admission.acquire("tts"):
+                result = endpoints.call(lambda endpoint: _synthesize_with_boundaries(endpoint.speech_config(), text, voice_name, language))
+            if not result.get("success"):
+                raise _ChunkFailed(result.get("message"))
+            return _pack_boundaries(result["audio"], result["words"])
+
+        try:
+            if result_cache.TTS_AUDIO_CACHE_ENABLED:
+                key = result_cache.content_key(text=text, voice=voice_name, language=language,
+                                               format="riff-16khz-16bit-mono-pcm+word-boundaries")
+                audio, boundaries = _unpack_boundaries(result_cache.tts_audio_cache.get_or_compute(key, compute))
+            else:
+                audio, boundaries = _unpack_boundaries(compute())
+        except _ChunkFailed as e:
             return {
                 "success": False,
-                "message": f"Synthesis canceled: {details.reason}. Error: {getattr(details, 'error_details', '')}",
-                "output_file": None,
+                "message": str(e),
+                "audio": None,
             }
-        else:
+        if not boundaries:
+            metrics.record_error("text_to_speech", "no_word_boundaries")
             return {
                 "success": False,
-                "message": f"Unexpected result: {result.reason}",
-                "output_file": None,
+                "message": "The speech service returned no word boundaries for this text.",
+                "audio": None,
             }
+        with metrics.stage("text_to_speech", "word_slicing"):
+            words = _slice_words(audio, boundaries)
+        return {
+            "success": True,
+            "message": f"Speech synthesized successfully ({len(words)} words).",
+            "audio": audio,
+            "words": words,
+        }
+    except (Overloaded, SpeechBackendError):
+        raise
     except Exception as e:
+        metrics.record_error("text_to_speech", e)
         return {
             "success": False,
             "message": f"Error during TTS: {str(e)}",
-            "output_file": None,
+            "audio": None,
+        }
+
+
+def _slice_words(audio: bytes, boundaries: list) -> list:
+    info = wav.parse_wav_header(audio)
+    total_sec = info.duration_sec if info else 0.0
+    pad = TTS_WORD_PAD_MS / 1000
+    words = []
+    for i, b in enumerate(boundaries):
+        start, end = b["offset_sec"], b["offset_sec"] + b["duration_sec"]
+        prev_end = boundaries[i - 1]["offset_sec"] + boundaries[i - 1]["duration_sec"] if i else 0.0
+        next_start = boundaries[i + 1]["offset_sec"] if i + 1 < len(boundaries) else total_sec
+        clip_start = max(start - pad, (prev_end + start) / 2 if i else 0.0)
+        clip_end = min(end + pad, (end + next_start) / 2 if i + 1 < len(boundaries) else total_sec)
+        words.append({**b, "audio": wav.slice_wav(audio, clip_start, clip_end)})
+    return words
+
+
+def _pack_boundaries(audio: bytes, words: list) -> bytes:
+    """One cache value holding the sentence WAV and its word boundaries: u32 length, JSON, WAV."""
+    meta = json.dumps(words, ensure_ascii=False).encode("utf-8")
+    return struct.pack("<I", len(meta)) + meta + audio
+
+
+def _unpack_boundaries(value: bytes) -> tuple:
+    (length,) = struct.unpack_from("<I", value)
+    return value[4 + length:], json.loads(value[4:4 + length])
+
+
+def _synthesize_with_boundaries(speech_config, text: str, voice_name: str, language: str):
+    """Synthesize once against a single endpoint, collecting word boundaries (offsets in the audio).
+
+    Raises SpeechBackendError when the service cancels with an error so callers can fail over.
+    """
+    speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm)
+    if voice_name:
+        speech_config.speech_synthesis_voice_name = voice_name
+    elif language:
+        speech_config.speech_synthesis_language = language
+    synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+
+    words = []
+
+    def word_boundary(evt: speechsdk.SpeechSynthesisWordBoundaryEventArgs):
+        if evt.boundary_type == speechsdk.SpeechSynthesisBoundaryType.Word:
+            words.append({
+                "word": evt.text,
+                "text_offset": evt.text_offset,
+                "offset_sec": evt.audio_offset / 10_000_000,
+                "duration_sec": evt.duration.total_seconds(),
+            })
+
+    synthesizer.synthesis_word_boundary.connect(word_boundary)
+    normalized = (text or "").strip()
+    escaped = ssml_text_start = None
+    try:
+        with metrics.stage("text_to_speech", "synthesis"):
+            # A lone word still goes through SSML with pauses, which the service renders more reliably.
+            if len(normalized.split()) <= 1 or len(normalized) < 4:
+                ssml = _short_text_ssml(normalized, voice_name, language, 200, 600)
+                escaped = html.escape(normalized, quote=True)
+                ssml_text_start = ssml.index(f"/>{escaped}.") + 2
+                result = synthesizer.speak_ssml_async(ssml).get()
+            else:
+                result = synthesizer.speak_text_async(text).get()
+    finally:
+        synthesizer.synthesis_word_boundary.disconnect_all()
+
+    if ssml_text_start is not None:
+        # SSML boundaries are offsets into the markup; map them back into the caller's text.
+        lead = len(text) - len(text.lstrip())
+        for w in words:
+            w["text_offset"] = lead + len(html.unescape(escaped[:max(0, w["text_offset"] - ssml_text_start)]))
+
+    if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+        if _audio_data_bytes(result.audio_data) < MIN_DATA_BYTES:
+            metrics.record_error("text_to_speech", "empty_audio")
+            return {
+                "success": False,
+                "message": "Synthesis completed but produced empty/invalid audio.",
+                "audio": None,
+            }
+        return {
+            "success": True,
+            "message": "Speech synthesized successfully.",
+            "audio": result.audio_data,
+            "words": sorted(words, key=lambda w: w["offset_sec"]),
+        }
+    if result.reason == speechsdk.ResultReason.Canceled:
+        details = result.cancellation_details
+        metrics.record_error("text_to_speech", "canceled")
+        if details.reason == speechsdk.CancellationReason.Error:
+            raise SpeechBackendError(f"Synthesis canceled: {details.reason}. Error: {getattr(details, 'error_details', '')}")
+        return {
+            "success": False,
+            "message": f"Synthesis canceled: {details.reason}. Error: {getattr(details, 'error_details', '')}",
+            "audio": None,
+        }
+    return {
+        "success": False,
+        "message": f"Unexpected result: {result.reason}",
+        "audio": None,
+    }
+
+
+def write_audio(output_path: str, audio: bytes):
+    """Persist audio with a single write to a temp file in the target directory, then rename."""
+    out_dir = os.path.dirname(output_path) or "."
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, output_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _short_text_ssml(text: str, voice_name: str, language: str, pre_ms: int, post_ms: int) -> str:
+    catalog = voice_catalog.get_catalog()
+    # Prefer provided voice; else the catalog default for the language; else generic English.
+    ssml_voice = voice_name or catalog.default_voice(language)
+    # Choose SSML language: prefer the voice's locale, else provided language, else default.
+    ssml_lang = catalog.locale_for(ssml_voice) or language or "en-US"
+
+    esc_text = html.escape(text, quote=True)
+    return (
+        f"<speak version='1.0' xml:lang='{ssml_lang}'>"
+        f"<voice name='{ssml_voice}'>"
+        f"<p><s><break time='{pre_ms}ms'/>"  # pre-pause
+        f"{esc_text}."
+        f"<break time='{post_ms}ms'/></s></p>"  # post-pause
+        f"</voice>"
+        f"</speak>"
+    )
+
+
+def _audio_data_bytes(audio: bytes) -> int:
+    """Size of the WAV `data` chunk, read from the RIFF chunk headers only."""
+    info = wav.parse_wav_header(audio) if audio else None
+    return info.data_size if info else 0
+
+
+def _synthesize(speech_config, text: str, voice_name: str, language: str):
+    """Synthesize once against a single speech endpoint, returning the WAV bytes in memory.
+
+    Raises SpeechBackendError when the service cancels with an error so callers can fail over.
+    """
+    # Use a stable PCM format to reduce edge cases with tiny outputs
+    try:
+        speech_config.set_speech_synthesis_output_format(
+            speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm
+        )
+    except Exception:
+        # Some SDK versions allow property assignment instead
+        try:
+            speech_config.speech_synthesis_output_format = (
+                speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm
+            )
+        except Exception:
+            pass
+    # Prefer explicit voice over language to avoid SDK routing oddities
+    if voice_name:
+        speech_config.speech_synthesis_voice_name = voice_name
+    elif language:
+        speech_config.speech_synthesis_language = language
+
+    # No audio output config: the synthesized WAV stays in memory on result.audio_data
+    synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+
+    # For very short inputs (single word or extremely short text), use SSML with an explicit <voice>
+    # and a short trailing break to encourage the SDK to emit a proper WAV consistently.
+    normalized = (text or "").strip()
+    word_count = len(normalized.split())
+    use_ssml = (word_count <= 1) or (len(normalized) < 4)
+    with metrics.stage("text_to_speech", "synthesis"):
+        if use_ssml:
+            result = synthesizer.speak_ssml_async(_short_text_ssml(normalized, voice_name, language, 200, 600)).get()
+        else:
+            result = synthesizer.speak_text_async(text).get()
+
+    if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+        audio = result.audio_data
+        data_bytes = _audio_data_bytes(audio)
+
+        # If too small and we used SSML, retry once on the same synthesizer with longer breaks
+        if data_bytes < MIN_DATA_BYTES and use_ssml:
+            retry_started = time.perf_counter()
+            try:
+                retry_result = synthesizer.speak_ssml_async(_short_text_ssml(normalized, voice_name, language, 300, 900)).get()
+                if retry_result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+                    audio = retry_result.audio_data
+                    data_bytes = _audio_data_bytes(audio)
+            except Exception:
+                pass
+            metrics.observe_stage("text_to_speech", "retry", time.perf_counter() - retry_started)
+            metrics.TTS_RETRIES.labels(
+                outcome="recovered" if data_bytes >= MIN_DATA_BYTES else "failed"
+            ).inc()
+
+        if data_bytes >= MIN_DATA_BYTES:
+            return {
+                "success": True,
+                "message": "Speech synthesized successfully.",
+                "audio": audio,
+            }
+
+        metrics.record_error("text_to_speech", "empty_audio")
+        return {
+            "success": False,
+            "message": "Synthesis completed but produced empty/invalid audio for very short input. Try a longer text or different voice.",
+            "audio": None,
+        }
+    elif result.reason == speechsdk.ResultReason.Canceled:
+        details = result.cancellation_details
+        metrics.record_error("text_to_speech", "canceled")
+        if details.reason == speechsdk.CancellationReason.Error:
+            # Connection/auth/quota failures: let the endpoint pool fail over to another region.
+            raise SpeechBackendError(f"Synthesis canceled: {details.reason}. Error: {getattr(details, 'error_details', '')}")
+        return {
+            "success": False,
+            "message": f"Synthesis canceled: {details.reason}. Error: {getattr(details, 'error_details', '')}",
+            "audio": None,
+        }
+    else:
+        return {
+            "success": False,
+            "message": f"Unexpected result: {result.reason}",
+            "audio": None,
         }
@@ -0,0 +1,185 @@
+import os
+import time
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+import azure.cognitiveservices.speech as speechsdk
+from core import result_cache, speech_endpoints
+from core.speech_endpoints import SpeechBackendError
+
+load_dotenv()
+
+VOICE_CATALOG_MAX_AGE_SEC = float(os.getenv("VOICE_CATALOG_MAX_AGE_SEC", str(7 * 24 * 3600)))
+
+FALLBACK_VOICE = "en-US-JennyNeural"
+# Preferred default voice per language; used when the catalog has that voice, and as the
+# offline fallback when neither the service nor a snapshot is available.
+PREFERRED_DEFAULTS = {
+    "ar": "ar-EG-SalmaNeural",
+    "en": "en-US-JennyNeural",
+    "zh": "zh-CN-XiaoxiaoNeural",
+    "fr": "fr-FR-DeniseNeural",
+    "es": "es-ES-ElviraNeural",
+    "de": "de-DE-KatjaNeural",
+    "it": "it-IT-ElsaNeural",
+    "ja": "ja-JP-NanamiNeural",
+    "ko": "ko-KR-SunHiNeural",
+    "pt": "pt-BR-FranciscaNeural",
+    "ru": "ru-RU-DariyaNeural",
+    "tr": "tr-TR-EmelNeural",
+}
+# The catalog snapshot lives in the shared cache, so one worker's fetch serves every worker.
+_SNAPSHOT_KEY = "catalog"
+
+
+def _locale_from_voice_name(voice_name: str) -> Optional[str]:
+    parts = (voice_name or "").split("-")
+    return f"{parts[0]}-{parts[1]}" if len(parts) >= 3 else None
+
+
+class VoiceCatalog:
+    """Voice list with O(1) lookups from voice to locale and from locale/language to a default voice.
+
+    `complete` is False for the built-in fallback, in which case unknown voices are not rejected.
+    """
+
+    def __init__(self, voices: list, fetched_at: Optional[float], complete: bool = True):
+        self.voices = voices
+        self.fetched_at = fetched_at
+        self.complete = complete
+        self.by_name = {v["short_name"].lower(): v for v in voices}
+        self.by_locale = {}
+        for v in voices:
+            self.by_locale.setdefault(v["locale"].lower(), []).append(v["short_name"])
+
+        preferred = {name.lower() for name in PREFERRED_DEFAULTS.values()}
+        self.locale_defaults = {}
+        for locale, names in self.by_locale.items():
+            chosen = next((n for n in names if n.lower() in preferred), None)
+            self.locale_defaults[locale] = chosen or names[0]
+        self.language_defaults = {}
+        for lang, name in PREFERRED_DEFAULTS.items():
+            if not self.complete or name.lower() in self.by_name:
+                self.language_defaults[lang] = name
+        for locale, name in self.locale_defaults.items():
+            self.language_defaults.setdefault(locale.split("-")[0], name)
+
+    def is_stale(self, now: float) -> bool:
+        """Whether the voice list is older than VOICE_CATALOG_MAX_AGE_SEC (or never came from the service)."""
+        return self.fetched_at is None or now - self.fetched_at > VOICE_CATALOG_MAX_AGE_SEC
+
+    def locale_for(self, voice_name: str) -> Optional[str]:
+        v = self.by_name.get((voice_name or "").lower())
+        return v["locale"] if v else _locale_from_voice_name(voice_name)
+
+    def default_voice(self, language: Optional[str]) -> str:
+        if not language:
+            return FALLBACK_VOICE
+        lc = language.lower()
+        return (
+            self.locale_defaults.get(lc)
+            or self.language_defaults.get(lc.split("-")[0])
+            or FALLBACK_VOICE
+        )
+
+    def validate(self, voice_name: Optional[str]) -> Optional[str]:
+        """Return an error message for a voice the service does not offer, else None."""
+        if not voice_name or not self.complete or voice_name.lower() in self.by_name:
+            return None
+        return f"Unknown voice '{voice_name}'. See GET /voices for the available voices."
+
+    def to_dict(self, locale: Optional[str] = None) -> dict:
+        voices = self.voices
+        if locale:
+            lc = locale.lower()
+            voices = [v for v in voices if v["locale"].lower() == lc or v["locale"].lower().startswith(lc + "-")]
+        return {
+            "voices": voices,
+            "locale_defaults": self.locale_defaults,
+            "fetched_at": self.fetched_at,
+            "complete": self.complete,
+        }
+
+
+def _fetch_voices() -> list:
+    def attempt(endpoint):
+        synthesizer = speechsdk.SpeechSynthesizer(speech_config=endpoint.speech_config(), audio_config=None)
+        result = synthesizer.get_voices_async().get()
+        if result.reason != speechsdk.ResultReason.VoicesListRetrieved:
+            raise SpeechBackendError(f"Voice list failed: {getattr(result, 'error_details', result.reason)}")
+        return [
+            {
+                "short_name": v.short_name,
+                "locale": v.locale,
+                "local_name": v.local_name,
+                "gender": str(v.gender).split(".")[-1],
+                "voice_type": str(v.voice_type).split(".")[-1],
+                "styles": [s for s in (v.style_list or []) if s],
+            }
+            for v in result.voices
+        ]
+
+    return speech_endpoints.pool("TTS", default_hedge_after_sec=3.0).call(attempt)
+
+
+def _read_snapshot() -> Optional[dict]:
+    snapshot = result_cache.voice_cache.get(_SNAPSHOT_KEY)
+    return snapshot if isinstance(snapshot, dict) and "voices" in snapshot else None
+
+
+def _write_snapshot(snapshot: dict):
+    result_cache.voice_cache.set(_SNAPSHOT_KEY, snapshot)
+
+
+def _fallback_catalog() -> VoiceCatalog:
+    voices = [{"short_name": name, "locale": _locale_from_voice_name(name)} for name in PREFERRED_DEFAULTS.values()]
+    return VoiceCatalog(voices, fetched_at=None, complete=False)
+
+
+_catalog: Optional[VoiceCatalog] = None
+_catalog_loaded_at = 0.0
+_catalog_lock = threading.Lock()
+# How long to keep the built-in fallback or a stale snapshot before trying the service again.
+_FALLBACK_RETRY_SEC = 300
+
+
+def load_catalog() -> VoiceCatalog:
+    """Load the catalog from the snapshot, fetching from the speech service when missing or stale."""
+    snapshot = _read_snapshot()
+    if snapshot and time.time() - snapshot.get("fetched_at", 0) <= VOICE_CATALOG_MAX_AGE_SEC:
+        return VoiceCatalog(snapshot["voices"], snapshot["fetched_at"])
+    try:
+        snapshot = {"voices": _fetch_voices(), "fetched_at": time.time()}
+        try:
+            _write_snapshot(snapshot)
+        except Exception:
+            pass
+    except Exception:
+        # Offline: a stale snapshot beats no validation at all. It keeps its old fetched_at,
+        # so get_catalog() tries the service again after _FALLBACK_RETRY_SEC.
+        snapshot = snapshot or _read_snapshot()
+        if not snapshot:
+            return _fallback_catalog()
+    return VoiceCatalog(snapshot["voices"], snapshot["fetched_at"])
+
+
+def _needs_load() -> bool:
+    if _catalog is None:
+        return True
+    now = time.time()
+    if _catalog.complete and not _catalog.is_stale(now):
+        return False
+    # Throttle reloads so an unreachable service is not asked on every request.
+    return now - _catalog_loaded_at > _FALLBACK_RETRY_SEC
+
+
+def get_catalog() -> VoiceCatalog:
+    """Process-wide catalog, loaded on first use and again once it is older than
+    VOICE_CATALOG_MAX_AGE_SEC (retried every _FALLBACK_RETRY_SEC while the service is unreachable)."""
+    global _catalog, _catalog_loaded_at
+    if _needs_load():
+        with _catalog_lock:
+            if _needs_load():
+                _catalog = load_catalog()
+                _catalog_loaded_at = time.time()
+    return _catalog
@@ -0,0 +1,6 @@
+"""Python client for the Notq API (sync and asyncio), with pooled connections and retries."""
+from notq_client._common import NotqError
+from notq_client.async_client import AsyncNotqClient
+from notq_client.client import NotqClient
+
+__all__ = ["NotqClient", "AsyncNotqClient", "NotqError"]
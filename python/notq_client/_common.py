@@ -0,0 +1,88 @@
+import os
+import random
+from typing import Optional
+
+import httpx
+
+# Transient statuses worth retrying; 429 honours Retry-After from the API's admission control.
+RETRY_STATUSES = {429, 502, 503, 504}
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.PoolTimeout)
+
+
+class NotqError(Exception):
+    """Non-2xx response from the Notq API (after retries)."""
+
+    def __init__(self, status_code: int, payload, message: Optional[str] = None):
+        self.status_code = status_code
+        self.payload = payload
+        if message is None and isinstance(payload, dict):
+            message = payload.get("message")
+        super().__init__(f"HTTP {status_code}: {message or payload}")
+
+
+def retry_delay(attempt: int, backoff: float, response: Optional[httpx.Response] = None, max_delay: float = 30.0) -> float:
+    """Exponential backoff with jitter, or the server's Retry-After when it sent one."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), max_delay)
+    return min(backoff * (2 ** attempt), max_delay) * (0.5 + random.random() / 2)
+
+
+def parse_payload(response: httpx.Response):
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+def check(response: httpx.Response):
+    payload = parse_payload(response)
+    if response.is_error:
+        raise NotqError(response.status_code, payload)
+    return payload
+
+
+def open_audio(audio, filename: Optional[str] = None):
+    """Normalize an audio argument (path, bytes, or binary file object) to (filename, fileobj, owned)."""
+    if isinstance(audio, (str, os.PathLike)):
+        return filename or os.path.basename(audio), open(audio, "rb"), True
+    if isinstance(audio, (bytes, bytearray)):
+        return filename or "audio.wav", bytes(audio), False
+    return filename or os.path.basename(getattr(audio, "name", "") or "audio.wav"), audio, False
+
+
+def rewind(files):
+    # File bodies are consumed by a failed attempt; rewind them before retrying.
+    for _, (_, body, *_) in (files.items() if isinstance(files, dict) else files):
+        if hasattr(body, "seek"):
+            body.seek(0)
+
+
+def assessment_form(reference_text: str, language: str, options: dict) -> dict:
+    data = {"reference_text": reference_text, "language": language}
+    for key in ("granularity", "prosody", "miscue", "analytics", "learner_id"):
+        value = options.get(key)
+        if value is not None:
+            data[key] = str(value).lower() if isinstance(value, bool) else value
+    return data
+
+
+def plan_form(system_prompt: str, context: str, objective: str, constraints, steps_hint, mode=None) -> dict:
+    data = {"system_prompt": system_prompt, "context": context, "objective": objective}
+    if constraints:
+        data["constraints"] = constraints if isinstance(constraints, str) else ", ".join(constraints)
+    if steps_hint:
+        data["steps_hint"] = str(int(steps_hint))
+    if mode:
+        data["mode"] = mode
+    return data
+
+
+def tts_audio_result(response: httpx.Response) -> dict:
+    return {
+        "success": True,
+        "audio": response.content,
+        "filename": response.headers.get("x-notq-filename"),
+        "download_url": response.headers.get("x-notq-download-url"),
+    }
@@ -0,0 +1,146 @@
+import asyncio
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+import httpx
+
+from notq_client._common import (
+    RETRY_EXCEPTIONS,
+    RETRY_STATUSES,
+    NotqError,
+    assessment_form,
+    check,
+    open_audio,
+    plan_form,
+    retry_delay,
+    rewind,
+    tts_audio_result,
+)
+
+
+class AsyncNotqClient:
+    """Asyncio variant of NotqClient with the same methods, retries and pooling."""
+
+    def __init__(self, base_url: str = "http://localhost:8000", timeout: float = 120.0, max_retries: int = 3,
+                 backoff: float = 0.5, max_connections: int = 20, headers: Optional[dict] = None):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._http = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            headers=headers,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def request(self, method: str, path: str, files=None, **kwargs) -> httpx.Response:
+        """Send a request with retries; returns the final response whatever its status."""
+        for attempt in range(self.max_retries + 1):
+            if files:
+                rewind(files)
+            try:
+                response = await self._http.request(method, path, files=files, **kwargs)
+            except RETRY_EXCEPTIONS:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(retry_delay(attempt, self.backoff))
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                return response
+            await asyncio.sleep(retry_delay(attempt, self.backoff, response))
+        raise RuntimeError("unreachable")
+
+    # Endpoints
+
+    async def health(self) -> dict:
+        return check(await self.request("GET", "/health"))
+
+    async def voices(self, locale: Optional[str] = None) -> dict:
+        return check(await self.request("GET", "/voices", params={"locale": locale} if locale else None))
+
+    async def level_measurement(self, audio, reference_text: str, language: str = "en-US", filename: Optional[str] = None, **options) -> dict:
+        return await self._assess("/level_measurement", audio, reference_text, language, filename, options)
+
+    async def word_level_measurement(self, audio, reference_text: str, language: str = "en-US", filename: Optional[str] = None, **options) -> dict:
+        return await self._assess("/word_level_measurement", audio, reference_text, language, filename, options)
+
+    async def _assess(self, path: str, audio, reference_text: str, language: str, filename: Optional[str], options: dict) -> dict:
+        # httpx streams file objects in chunks even on the async client.
+        name, body, owned = open_audio(audio, filename)
+        try:
+            files = {"audio_file": (name, body, "application/octet-stream")}
+            return check(await self.request("POST", path, files=files, data=assessment_form(reference_text, language, options)))
+        finally:
+            if owned:
+                body.close()
+
+    async def batch_level_measurement(self, audios, reference_text: str, language: str = "en-US", **options) -> dict:
+        """Assess many recordings of one passage in one request; returns per-file results and cohort aggregates."""
+        opened = [open_audio(audio) for audio in audios]
+        try:
+            files = [("audio_files", (name, body, "application/octet-stream")) for name, body, _ in opened]
+            return check(await self.request("POST", "/batch_level_measurement", files=files, data=assessment_form(reference_text, language, options)))
+        finally:
+            for _, body, owned in opened:
+                if owned:
+                    body.close()
+
+    async def text_to_speech(self, text: str, voice_name: str, language: str = "en-US", include_audio: bool = False,
+                             long_text: Optional[bool] = None) -> dict:
+        data = {"text": text, "voice_name": voice_name, "language": language}
+        if long_text is not None:
+            data["long_text"] = str(long_text).lower()
+        if include_audio:
+            data["response_format"] = "audio"
+            response = await self.request("POST", "/text_to_speach", data=data)
+            if response.is_error:
+                check(response)
+            return tts_audio_result(response)
+        return check(await self.request("POST", "/text_to_speach", data=data))
+
+    async def text_to_speech_words(self, text: str, voice_name: str, language: str = "en-US") -> dict:
+        return check(await self.request("POST", "/text_to_speach_words", data={"text": text, "voice_name": voice_name, "language": language}))
+
+    async def generate_plan(self, system_prompt: str, context: str, objective: str, constraints=None, steps_hint: Optional[int] = None, mode: Optional[str] = None) -> dict:
+        return check(await self.request("POST", "/generate_plan", data=plan_form(system_prompt, context, objective, constraints, steps_hint, mode)))
+
+    # Batch helpers
+
+    async def measure_many(self, items: Iterable[dict], concurrency: int = 4, word_level: bool = False) -> List:
+        method = self.word_level_measurement if word_level else self.level_measurement
+        return await self._gather(lambda item: method(**item), items, concurrency)
+
+    async def synthesize_many(self, items: Iterable[dict], concurrency: int = 4) -> List:
+        return await self._gather(lambda item: self.text_to_speech(**item), items, concurrency)
+
+    @staticmethod
+    async def _gather(fn: Callable[[dict], Awaitable], items: Iterable[dict], concurrency: int) -> List:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def _one(item):
+            async with semaphore:
+                try:
+                    return await fn(item)
+                except NotqError as e:
+                    return e
+
+        return await asyncio.gather(*(_one(item) for item in items))
+
+    async def poll(self, path: str, until: Callable[[dict], bool], interval: float = 1.0, timeout: float = 300.0, max_interval: float = 10.0) -> dict:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            payload = check(await self.request("GET", path))
+            if until(payload):
+                return payload
+            if loop.time() + interval > deadline:
+                raise TimeoutError(f"{path} not ready after {timeout}s")
+            await asyncio.sleep(interval)
+            interval = min(interval * 1.5, max_interval)
@@ -0,0 +1,160 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+import httpx
+
+from notq_client._common import (
+    RETRY_EXCEPTIONS,
+    RETRY_STATUSES,
+    NotqError,
+    assessment_form,
+    check,
+    open_audio,
+    plan_form,
+    retry_delay,
+    rewind,
+    tts_audio_result,
+)
+
+
+class NotqClient:
+    """Synchronous Notq API client over one pooled keep-alive connection pool.
+
+    Create it once and reuse it (it is thread-safe); every call retries connection
+    errors, timeouts and 429/502/503/504 with exponential backoff.
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", timeout: float = 120.0, max_retries: int = 3,
+                 backoff: float = 0.5, max_connections: int = 20, headers: Optional[dict] = None):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._http = httpx.Client(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            headers=headers,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._http.close()
+
+    def request(self, method: str, path: str, files=None, **kwargs) -> httpx.Response:
+        """Send a request with retries; returns the final response whatever its status."""
+        for attempt in range(self.max_retries + 1):
+            if files:
+                rewind(files)
+            try:
+                response = self._http.request(method, path, files=files, **kwargs)
+            except RETRY_EXCEPTIONS:
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(retry_delay(attempt, self.backoff))
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                return response
+            time.sleep(retry_delay(attempt, self.backoff, response))
+        raise RuntimeError("unreachable")
+
+    # Endpoints
+
+    def health(self) -> dict:
+        return check(self.request("GET", "/health"))
+
+    def voices(self, locale: Optional[str] = None) -> dict:
+        return check(self.request("GET", "/voices", params={"locale": locale} if locale else None))
+
+    def level_measurement(self, audio, reference_text: str, language: str = "en-US", filename: Optional[str] = None, **options) -> dict:
+        """Assess a recording. `audio` is a path, bytes or binary file object; paths are streamed from disk.
+
+        Options: granularity, prosody, miscue, analytics, learner_id (see the API docs).
+        """
+        return self._assess("/level_measurement", audio, reference_text, language, filename, options)
+
+    def word_level_measurement(self, audio, reference_text: str, language: str = "en-US", filename: Optional[str] = None, **options) -> dict:
+        return self._assess("/word_level_measurement", audio, reference_text, language, filename, options)
+
+    def _assess(self, path: str, audio, reference_text: str, language: str, filename: Optional[str], options: dict) -> dict:
+        name, body, owned = open_audio(audio, filename)
+        try:
+            files = {"audio_file": (name, body, "application/octet-stream")}
+            return check(self.request("POST", path, files=files, data=assessment_form(reference_text, language, options)))
+        finally:
+            if owned:
+                body.close()
+
+    def batch_level_measurement(self, audios, reference_text: str, language: str = "en-US", **options) -> dict:
+        """Assess many recordings of one passage in one request; returns per-file results and cohort aggregates."""
+        opened = [open_audio(audio) for audio in audios]
+        try:
+            files = [("audio_files", (name, body, "application/octet-stream")) for name, body, _ in opened]
+            return check(self.request("POST", "/batch_level_measurement", files=files, data=assessment_form(reference_text, language, options)))
+        finally:
+            for _, body, owned in opened:
+                if owned:
+                    body.close()
+
+    def text_to_speech(self, text: str, voice_name: str, language: str = "en-US", include_audio: bool = False,
+                       long_text: Optional[bool] = None) -> dict:
+        """Synthesize speech. With include_audio=True the WAV bytes come back in the same response as `audio`."""
+        data = {"text": text, "voice_name": voice_name, "language": language}
+        if long_text is not None:
+            data["long_text"] = str(long_text).lower()
+        if include_audio:
+            data["response_format"] = "audio"
+            response = self.request("POST", "/text_to_speach", data=data)
+            if response.is_error:
+                check(response)
+            return tts_audio_result(response)
+        return check(self.request("POST", "/text_to_speach", data=data))
+
+    def text_to_speech_words(self, text: str, voice_name: str, language: str = "en-US") -> dict:
+        """Synthesize a sentence once and get one clip per word: `words` holds each word's timing and `download_url`."""
+        return check(self.request("POST", "/text_to_speach_words", data={"text": text, "voice_name": voice_name, "language": language}))
+
+    def generate_plan(self, system_prompt: str, context: str, objective: str, constraints=None, steps_hint: Optional[int] = None, mode: Optional[str] = None) -> dict:
+        return check(self.request("POST", "/generate_plan", data=plan_form(system_prompt, context, objective, constraints, steps_hint, mode)))
+
+    # Batch helpers
+
+    def measure_many(self, items: Iterable[dict], concurrency: int = 4, word_level: bool = False) -> List:
+        """Run many assessments concurrently over the shared pool.
+
+        Each item holds the keyword arguments of `level_measurement`. Results keep input order;
+        failed items yield their NotqError instead of raising.
+        """
+        method = self.word_level_measurement if word_level else self.level_measurement
+        return self._map(lambda item: method(**item), items, concurrency)
+
+    def synthesize_many(self, items: Iterable[dict], concurrency: int = 4) -> List:
+        """Run many `text_to_speech` calls concurrently; items hold its keyword arguments."""
+        return self._map(lambda item: self.text_to_speech(**item), items, concurrency)
+
+    @staticmethod
+    def _map(fn: Callable, items: Iterable[dict], concurrency: int) -> List:
+        def _safe(item):
+            try:
+                return fn(item)
+            except NotqError as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            return list(pool.map(_safe, items))
+
+    def poll(self, path: str, until: Callable[[dict], bool], interval: float = 1.0, timeout: float = 300.0, max_interval: float = 10.0) -> dict:
+        """GET `path` until `until(payload)` is true, backing off between polls; raises TimeoutError."""
+        deadline = time.monotonic() + timeout
+        while True:
+            payload = check(self.request("GET", path))
+            if until(payload):
+                return payload
+            if time.monotonic() + interval > deadline:
+                raise TimeoutError(f"{path} not ready after {timeout}s")
+            time.sleep(interval)
+            interval = min(interval * 1.5, max_interval)
@@ -1,19 +1,20 @@
 import os
 import io
 import json
-from urllib.parse import urljoin
 
 import streamlit as st
-import requests
 from dotenv import load_dotenv
 
+from notq_client import NotqClient, NotqError
+
 # Load environment variables (expects API_URL in .env or environment)
 load_dotenv()
 DEFAULT_API_URL = os.getenv("API_URL", "http://localhost:8000").rstrip("/")
 
-# Voice options list (you can extend this later)
-VOICE_OPTIONS = [
-    "en-US-AndrewMultilingualNeural",  # default
+# Fallback voice options, used when the API's /voices catalog is unreachable
+DEFAULT_VOICE = "en-US-AndrewMultilingualNeural"
+FALLBACK_VOICE_OPTIONS = [
+    DEFAULT_VOICE,
     "en-US-JennyNeural",
     "en-US-GuyNeural",
     "ar-EG-SalmaNeural",
@@ -23,6 +24,27 @@ VOICE_OPTIONS = [
     "es-ES-ElviraNeural",
 ]
 
+
+@st.cache_resource(show_spinner=False)
+def get_client(base_url: str) -> NotqClient:
+    """One pooled client per API base URL, reused across reruns and sessions."""
+    return NotqClient(base_url)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_voice_options(base_url: str) -> list:
+    """Voice names from the API's voice catalog, with the default voice first."""
+    try:
+        names = sorted(v["short_name"] for v in get_client(base_url).voices().get("voices", []))
+    except Exception:
+        names = []
+    if not names:
+        return FALLBACK_VOICE_OPTIONS
+    if DEFAULT_VOICE in names:
+        names.remove(DEFAULT_VOICE)
+        names.insert(0, DEFAULT_VOICE)
+    return names
+
 st.set_page_config(page_title="notq-ai API Tester", layout="wide")
 
 # Sidebar: API base URL selection
@@ -32,6 +54,7 @@ if not api_url:
     st.sidebar.warning("API base URL is required. Using default http://localhost:8000")
     api_url = "http://localhost:8000"
 api_url = api_url.rstrip("/")
+client = get_client(api_url)
 
 st.sidebar.markdown("---")
 page = st.sidebar.radio("Endpoints", [
@@ -42,38 +65,32 @@ page = st.sidebar.radio("Endpoints", [
     "Generate Plan",
 ])
 
-# Helper: POST multipart/form-data with file
+# Helper: call the API through the client, returning (status, payload); status is None on network errors
 
-def post_multipart(url: str, files: dict, data: dict):
+def call_api(fn, *args, **kwargs):
     try:
-        resp = requests.post(url, files=files, data=data, timeout=120)
-        return resp
+        return 200, fn(*args, **kwargs)
+    except NotqError as e:
+        return e.status_code, e.payload
     except Exception as e:
-        return None
+        st.error(f"Request failed: {e}")
+        return None, None
 
-# Helper: POST form data
-
-def post_form(url: str, data: dict):
-    try:
-        resp = requests.post(url, data=data, timeout=120)
-        return resp
-    except Exception:
-        return None
+def show_payload(status, payload):
+    st.write("Status:", status)
+    if isinstance(payload, (dict, list)):
+        st.json(payload)
+    else:
+        st.text(payload)
 
 # Health Page
 if page == "Health":
     st.title("/health")
     st.write("Quick check that the FastAPI service is up.")
     if st.button("Check Health"):
-        try:
-            r = requests.get(urljoin(api_url + "/", "health"), timeout=15)
-            st.write("Status:", r.status_code)
-            try:
-                st.json(r.json())
-            except Exception:
-                st.text(r.text)
-        except Exception as e:
-            st.error(f"Request failed: {e}")
+        status, payload = call_api(client.health)
+        if status is not None:
+            show_payload(status, payload)
 
 # Level Measurement Page
 elif page == "Level Measurement":
@@ -87,23 +104,10 @@ elif page == "Level Measurement":
         if not audio or not reference_text.strip():
             st.warning("Please provide an audio file and reference text.")
         else:
-            files = {
-                "audio_file": (audio.name, audio.getvalue(), audio.type or "application/octet-stream"),
-            }
-            data = {
-                "reference_text": reference_text,
-                "language": language,
-            }
             with st.spinner("Submitting request..."):
-                resp = post_multipart(urljoin(api_url + "/", "level_measurement"), files, data)
-            if not resp:
-                st.error("Request failed (network error).")
-            else:
-                st.write("Status:", resp.status_code)
-                try:
-                    st.json(resp.json())
-                except Exception:
-                    st.text(resp.text)
+                status, payload = call_api(client.level_measurement, audio.getvalue(), reference_text, language, filename=audio.name)
+            if status is not None:
+                show_payload(status, payload)
 
 # Word Level Measurement Page
 elif page == "Word Level Measurement":
@@ -117,23 +121,10 @@ elif page == "Word Level Measurement":
         if not audio or not reference_text.strip():
             st.warning("Please provide an audio file and reference text.")
         else:
-            files = {
-                "audio_file": (audio.name, audio.getvalue(), audio.type or "application/octet-stream"),
-            }
-            data = {
-                "reference_text": reference_text,
-                "language": language,
-            }
             with st.spinner("Submitting request..."):
-                resp = post_multipart(urljoin(api_url + "/", "word_level_measurement"), files, data)
-            if not resp:
-                st.error("Request failed (network error).")
-            else:
-                st.write("Status:", resp.status_code)
-                try:
-                    st.json(resp.json())
-                except Exception:
-                    st.text(resp.text)
+                status, payload = call_api(client.word_level_measurement, audio.getvalue(), reference_text, language, filename=audio.name)
+            if status is not None:
+                show_payload(status, payload)
 
 # Text to Speech Page
 elif page == "Text to Speech":
@@ -144,7 +135,7 @@ elif page == "Text to Speech":
     text = st.text_area("Text", height=120, placeholder="Type a short sentence or a word...")
     voice_name = st.selectbox(
         "Voice",
-        options=VOICE_OPTIONS,
+        options=load_voice_options(api_url),
         index=0,
         help="Select an Azure neural voice. Default is en-US-AndrewMultilingualNeural.",
     )
@@ -154,42 +145,21 @@ elif page == "Text to Speech":
         if not text.strip():
             st.warning("Please enter some text.")
         else:
-            data = {
-                "text": text,
-                "voice_name": voice_name,
-                "language": language,
-            }
+            # The audio comes back in the same response, so inline playback needs no second request
             with st.spinner("Calling TTS..."):
-                resp = post_form(urljoin(api_url + "/", "text_to_speach"), data)
-            if not resp:
-                st.error("Request failed (network error).")
-            else:
-                st.write("Status:", resp.status_code)
-                try:
-                    payload = resp.json()
-                except Exception:
-                    payload = None
-
-                if not payload:
-                    st.text(resp.text)
+                status, payload = call_api(client.text_to_speech, text, voice_name, language, include_audio=True)
+            if status is not None:
+                if not isinstance(payload, dict) or "audio" not in payload:
+                    show_payload(status, payload)
                 else:
-                    st.json(payload)
-                    if payload.get("success"):
-                        # Build absolute URL if needed
-                        download_url = payload.get("download_url") or ""
-                        if download_url.startswith("/"):
-                            download_url = api_url + download_url
-
-                        st.markdown(f"[Download audio]({download_url})")
-                        # Fetch audio bytes for inline playback to avoid CORS issues
-                        try:
-                            r2 = requests.get(download_url, timeout=60)
-                            if r2.ok:
-                                st.audio(r2.content, format="audio/wav")
-                            else:
-                                st.info("Could not fetch audio for inline play; use the download link above.")
-                        except Exception:
-                            st.info("Could not fetch audio for inline play; use the download link above.")
+                    audio_bytes = payload.pop("audio")
+                    show_payload(status, payload)
+                    # Build absolute URL if needed
+                    download_url = payload.get("download_url") or ""
+                    if download_url.startswith("/"):
+                        download_url = api_url + download_url
+                    st.markdown(f"[Download audio]({download_url})")
+                    st.audio(audio_bytes, format="audio/wav")
 
 # Generate Plan Page
 elif page == "Generate Plan":
@@ -233,33 +203,16 @@ elif page == "Generate Plan":
         elif not objective.strip():
             st.warning("Please provide the objective.")
         else:
-            data = {
-                "system_prompt": system_prompt,
-                "context": context_text,
-                "objective": objective,
-            }
             # Only include optional fields if provided/valid
-            if constraints_text.strip():
-                data["constraints"] = constraints_text
-            if isinstance(steps_hint, (int, float)) and int(steps_hint) > 0:
-                data["steps_hint"] = int(steps_hint)
+            constraints = constraints_text if constraints_text.strip() else None
+            hint = int(steps_hint) if isinstance(steps_hint, (int, float)) and int(steps_hint) > 0 else None
 
             with st.spinner("Requesting plan..."):
-                resp = post_form(urljoin(api_url + "/", "generate_plan"), data)
-
-            if not resp:
-                st.error("Request failed (network error).")
-            else:
-                st.write("Status:", resp.status_code)
-                try:
-                    payload = resp.json()
-                except Exception:
-                    payload = None
+                status, payload = call_api(client.generate_plan, system_prompt, context_text, objective, constraints, hint)
 
-                if not payload:
-                    st.text(resp.text)
-                else:
-                    st.json(payload)
+            if status is not None:
+                show_payload(status, payload)
+                if isinstance(payload, dict):
                     if payload.get("success") and isinstance(payload.get("plan"), dict):
                         plan = payload["plan"]
                         st.markdown("---")